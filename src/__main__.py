@@ -2,46 +2,45 @@ import sys
 import os
 import os.path as osp
 import logging
-import pdb
 
 from . import swamp
+from . import batch
+from . import daemon
 from . import cli_argparse
 from . import logger
 
 
-def main():
-    clargs = cli_argparse.process_cmd_line_args()
+def run_job(input_dir, output_dir, build_dir, tool_dir, results_dir,
+            version=None, platform=None):
 
-    print(clargs)
-    if not osp.isdir(clargs.output_dir):
-        os.makedirs(clargs.output_dir, exist_ok=True)
+    if not osp.isdir(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
 
-    logger.init(clargs.output_dir)
+    logger.init(output_dir)
 
-    if clargs.version:
-        logging.info(clargs.version)
+    if version:
+        logging.info(version)
 
-    if clargs.platform:
-        logging.info('PLATFORM: ' + clargs.platform)
+    if platform:
+        logging.info('PLATFORM: ' + platform)
    
     try:
         # os.environ['SCRIPTS_DIR'] = osp.join(os.getenv('HOME'), 'scripts')
         os.environ['SCRIPTS_DIR'] = osp.join(os.getcwd(), 'scripts')
-        os.environ['TOOL_ROOT_DIR'] = osp.realpath(clargs.tool_dir)
+        os.environ['TOOL_ROOT_DIR'] = osp.realpath(tool_dir)
         os.environ['TOOL_DIR'] = os.environ['TOOL_ROOT_DIR']
 
         if 'VMINPUTDIR' not in os.environ:
-            os.environ['VMINPUTDIR'] = osp.realpath(clargs.input_dir)
+            os.environ['VMINPUTDIR'] = osp.realpath(input_dir)
 
         if 'VMOUTPUTDIR' not in os.environ:
-            os.environ['VMOUTPUTDIR'] = osp.realpath(clargs.output_dir)
-
-        exit_code = swamp.main(osp.realpath(clargs.input_dir),
-                               osp.realpath(clargs.output_dir),
-                               osp.realpath(clargs.build_dir),
-                               osp.realpath(clargs.tool_dir),
-                               osp.realpath(clargs.results_dir))
-        sys.exit(exit_code)
+            os.environ['VMOUTPUTDIR'] = osp.realpath(output_dir)
+
+        return swamp.main(osp.realpath(input_dir),
+                          osp.realpath(output_dir),
+                          osp.realpath(build_dir),
+                          osp.realpath(tool_dir),
+                          osp.realpath(results_dir))
     except (Exception) as e:
         print(e)
     finally:
@@ -51,5 +50,36 @@ def main():
         os.environ.pop('TOOL_DIR')
 
 
+def main():
+    clargs = cli_argparse.process_cmd_line_args()
+
+    print(clargs)
+
+    def _run_job(*job_dirs):
+        return run_job(*job_dirs, version=clargs.version, platform=clargs.platform)
+
+    if clargs.batch_manifest or clargs.daemon_socket:
+        logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
+
+    if clargs.batch_manifest:
+        sys.exit(batch.main(clargs.batch_manifest,
+                            clargs.batch_jobs,
+                            clargs.batch_summary,
+                            _run_job))
+
+    if clargs.daemon_socket:
+        sys.exit(daemon.main(clargs.daemon_socket,
+                             clargs.batch_jobs,
+                             _run_job))
+
+    sys.exit(run_job(clargs.input_dir,
+                     clargs.output_dir,
+                     clargs.build_dir,
+                     clargs.tool_dir,
+                     clargs.results_dir,
+                     clargs.version,
+                     clargs.platform))
+
+
 if __name__ == '__main__':
     main()
@@ -1,66 +1,140 @@
+import os
 import os.path as osp
 import shutil
 import logging
+import importlib
+import concurrent.futures
+from collections import namedtuple
 
+from .helper import load_build_artifacts_helper
 from .helper import BuildArtifactsError
 from .helper import BuildSummaryError
 from .swa_tool import SwaToolBase
-from .swa_tool import SwaTool
-from .web_tools import Flow
-from .web_tools import Retire
-from .web_tools import PhpTool
-from .web_tools import Lizard
-from .web_tools import JsTool
-from .web_tools import Eslint
-from .python_tools import PythonTool
-from .csharp_tools import DevskimTool
-from .csharp_tools import RoslynSecurityGuard
 
 from .. import utillib
 from .. import confreader
 from ..logger import LogTaskStatus
 
 
-def assess(input_root_dir, output_root_dir, tool_root_dir,
-           results_root_dir, build_summary_file):
+# name is None if run.conf does not have 'tool-conf-files'
+ToolRun = namedtuple('ToolRun', ['name', 'tool_conf_file',
+                                 'tool_root_dir', 'results_root_dir'])
+
+ToolAssessment = namedtuple('ToolAssessment', ['name', 'exit_code',
+                                               'assessment_summary_file',
+                                               'results_root_dir'])
+
+
+def get_tool_conf_files(input_root_dir):
+    '''Returns the tool conf files in 'tool-conf-files' (comma or space separated)
+    in run.conf, an empty list if it is not there'''
+
+    run_conf = confreader.read_conf_into_dict(osp.join(input_root_dir, 'run.conf'))
+    return run_conf.get('tool-conf-files', '').replace(',', ' ').split()
+
+
+# tool-type to (module, class), the module is imported only
+# when the tool is used. Other tool types are JsTool
+TOOL_CLASSES = {
+    'flow': ('.web_tools', 'Flow'),
+    'eslint': ('.web_tools', 'Eslint'),
+    'retire-js': ('.web_tools', 'Retire'),
+    'cloc': ('.swa_tool', 'SwaTool'),
+    'lizard': ('.web_tools', 'Lizard'),
+    'php_codesniffer': ('.web_tools', 'PhpTool'),
+    'phpmd': ('.web_tools', 'PhpTool'),
+    'pylint': ('.python_tools', 'PythonTool'),
+    'bandit': ('.python_tools', 'PythonTool'),
+    'flake8': ('.python_tools', 'PythonTool'),
+    'radon': ('.python_tools', 'PythonTool'),
+    'devskim': ('.csharp_tools', 'DevskimTool'),
+    'security-code-scan': ('.csharp_tools', 'RoslynSecurityGuard'),
+    'roslyn-security-gaurd': ('.csharp_tools', 'RoslynSecurityGuard'),
+    'code-cracker': ('.csharp_tools', 'RoslynSecurityGuard'),
+}
+
+DEFAULT_TOOL_CLASS = ('.web_tools', 'JsTool')
 
-    tool_conf_file = osp.join(input_root_dir, SwaToolBase.TOOL_DOT_CONF)
-    tool_conf = confreader.read_conf_into_dict(tool_conf_file)
+
+def import_tool_modules():
+    '''Imports the modules of all the tools, for the batch and daemon modes
+    that fork the jobs. A single job imports only the module of its tool'''
+
+    for module_name in sorted({module_name for module_name, _
+                               in list(TOOL_CLASSES.values()) + [DEFAULT_TOOL_CLASS]}):
+        importlib.import_module(module_name, __name__)
+
+
+def get_tool_class(tool_conf_file, input_root_dir):
+
+    tool_conf = confreader.read_conf_into_dict(osp.join(input_root_dir, tool_conf_file))
     tool_type = tool_conf['tool-type'].lower()
 
-    if tool_type == 'flow':
-        swa_tool = Flow(input_root_dir, tool_root_dir)
-    elif tool_type == 'eslint':
-        swa_tool = Eslint(input_root_dir, tool_root_dir)
-    elif tool_type == 'retire-js':
-        swa_tool = Retire(input_root_dir, tool_root_dir)
-    elif tool_type == 'cloc':
-        swa_tool = SwaTool(input_root_dir, tool_root_dir)
-    elif tool_type == 'lizard':
-        swa_tool = Lizard(input_root_dir, tool_root_dir)
-    elif tool_type in ['php_codesniffer', 'phpmd']:
-        swa_tool = PhpTool(input_root_dir, tool_root_dir)
-    elif tool_type in ['pylint', 'bandit', 'flake8', 'radon']:
-        swa_tool = PythonTool(input_root_dir, build_summary_file, tool_root_dir)
-    elif tool_type == 'devskim':
-        swa_tool = DevskimTool(input_root_dir, tool_root_dir)
-    elif tool_type in ['security-code-scan', 'roslyn-security-gaurd', 'code-cracker']:
-        swa_tool = RoslynSecurityGuard(input_root_dir, tool_root_dir)
+    module_name, class_name = TOOL_CLASSES.get(tool_type, DEFAULT_TOOL_CLASS)
+    return getattr(importlib.import_module(module_name, __name__), class_name)
+
+
+def get_tool_obj(tool_conf_file, input_root_dir, tool_root_dir, build_artifacts_helper):
+
+    tool_class = get_tool_class(tool_conf_file, input_root_dir)
+
+    if tool_class.NEEDS_BUILD_ARTIFACTS:
+        return tool_class(input_root_dir, build_artifacts_helper, tool_root_dir, tool_conf_file)
     else:
-        swa_tool = JsTool(input_root_dir, tool_root_dir)
-        
+        return tool_class(input_root_dir, tool_root_dir, tool_conf_file)
+
+
+def _get_results_name(name, basename):
+    return basename if name is None else '{0}-{1}'.format(basename, name)
+
+
+def _get_task_msg(name, msg):
+    return msg if name is None else '{0}: {1}'.format(name, msg)
+
+
+def _write_results_conf(name, output_root_dir, results_root_dir,
+                        exit_code, assessment_summary_file):
+
+    results_conf = dict()
+    results_conf['exit-code'] = str(exit_code)
+
+    if assessment_summary_file and osp.isfile(assessment_summary_file):
+        results_conf['assessment-summary-file'] = osp.basename(assessment_summary_file)
+
+        with LogTaskStatus('results-archive', msg_inline=name):
+            results_archive = shutil.make_archive(osp.join(output_root_dir,
+                                                           _get_results_name(name, 'results')),
+                                                  'gztar',
+                                                  osp.dirname(results_root_dir),
+                                                  osp.basename(results_root_dir))
+
+            results_conf['results-archive'] = osp.basename(results_archive)
+            results_conf['results-dir'] = osp.basename(results_root_dir)
+
+    # Written even if the assessment failed, with exit-code 1
+    utillib.write_to_file(osp.join(output_root_dir,
+                                   _get_results_name(name, 'results') + '.conf'),
+                          results_conf)
+
+
+def _assess_tool(swa_tool, name, output_root_dir,
+                 results_root_dir, build_artifacts_helper):
+
+    exit_code = 1
+    assessment_summary_file = None
+
     try:
         with LogTaskStatus('assess') as status_dot_out:
 
             (passed,
              failed,
              error_msgs,
-             assessment_summary_file) = swa_tool.assess(build_summary_file,
+             assessment_summary_file) = swa_tool.assess(build_artifacts_helper,
                                                         results_root_dir)
 
             if passed == 0 and failed == 0:
                 exit_code = 0
-                status_dot_out.skip_task('no files')
+                status_dot_out.skip_task(_get_task_msg(name, 'no files'))
                 # status_dot_out.skip_task(task_msg=None,
                 # task_msg_indetail="No relavent files found to run '%s'" % tool_type)
             else:
@@ -72,7 +146,9 @@ def assess(input_root_dir, output_root_dir, tool_root_dir,
                                            error_msgs)
 
                 status_dot_out.update_task_status(exit_code,
-                                                  'pass: {0}, fail: {1}'.format(passed, failed))
+                                                  _get_task_msg(name,
+                                                                'pass: {0}, fail: {1}'.format(passed,
+                                                                                              failed)))
     except (BuildArtifactsError,
             BuildSummaryError) as err:
         logging.exception(err)
@@ -80,22 +156,132 @@ def assess(input_root_dir, output_root_dir, tool_root_dir,
         assessment_summary_file = None
 
     finally:
-        results_conf = dict()
-        results_conf['exit-code'] = str(exit_code)
+        swa_tool.remove_list_files()
+        _write_results_conf(name, output_root_dir, results_root_dir,
+                            exit_code, assessment_summary_file)
+
+    return ToolAssessment(name, exit_code, assessment_summary_file, results_root_dir)
+
 
-        if assessment_summary_file and osp.isfile(assessment_summary_file):
-            results_conf['assessment-summary-file'] = osp.basename(assessment_summary_file)
+def get_tool_run_names(tool_conf_files):
+    '''Returns a unique name for every tool conf file: the file name without
+    the extension, or the path without the extension (with '-' for '/') if
+    another tool conf file has the same name, with a number if still not unique'''
+
+    names = [osp.splitext(osp.basename(tool_conf_file))[0]
+             for tool_conf_file in tool_conf_files]
+
+    names = [osp.splitext(osp.normpath(tool_conf_file))[0].strip(os.sep).replace(os.sep, '-')
+             if names.count(name) > 1 else name
+             for tool_conf_file, name in zip(tool_conf_files, names)]
+
+    return [name if names.count(name) == 1 else '{0}-{1}'.format(name, names[:i].count(name) + 1)
+            for i, name in enumerate(names)]
+
+
+def get_tool_runs(input_root_dir, tool_root_dir, results_root_dir):
+    '''Returns a ToolRun for every tool in get_tool_conf_files.
+    With more than one tool, each tool gets its own tool and results directories
+    (<tool_root_dir>/<name>, <results_root_dir>-<name>) and results-<name>.conf,
+    <name> being from get_tool_run_names'''
+
+    tool_conf_files = get_tool_conf_files(input_root_dir)
+
+    if not tool_conf_files:
+        return [ToolRun(None, SwaToolBase.TOOL_DOT_CONF, tool_root_dir, results_root_dir)]
+
+    tool_runs = list()
+    for tool_conf_file, name in zip(tool_conf_files, get_tool_run_names(tool_conf_files)):
+        tool_runs.append(ToolRun(name,
+                                 tool_conf_file,
+                                 osp.join(tool_root_dir, name),
+                                 _get_results_name(name, results_root_dir)))
+    return tool_runs
+
+
+def needs_build_artifacts(input_root_dir, tool_runs):
+    '''True if installing any of the tools needs the build'''
+    return any(get_tool_class(tool_run.tool_conf_file, input_root_dir).NEEDS_BUILD_ARTIFACTS
+               for tool_run in tool_runs)
+
+
+def has_exclusive_tools(input_root_dir, tool_runs):
+    '''True if any of the tools modifies the package directory'''
+    return any(get_tool_class(tool_run.tool_conf_file, input_root_dir).EXCLUSIVE
+               for tool_run in tool_runs)
+
+
+def get_build_artifacts_helper(build_summary_file):
+    '''Returns None if the build summary cannot be used for assessment'''
+
+    try:
+        return load_build_artifacts_helper(build_summary_file)
+    except (BuildArtifactsError,
+            BuildSummaryError) as err:
+        logging.exception(err)
+        return None
+
+
+def install_tools(input_root_dir, tool_runs, build_artifacts_helper):
+    '''Unarchives and installs the tools, returns the list of SwaToolBase objects'''
+
+    # One by one, installs may share directories
+    return [get_tool_obj(tool_run.tool_conf_file,
+                         input_root_dir,
+                         tool_run.tool_root_dir,
+                         build_artifacts_helper)
+            for tool_run in tool_runs]
+
+
+def assess_tools(output_root_dir, tool_runs, tools, build_artifacts_helper):
+    '''Runs the tools on the build, returns a list of ToolAssessment.
+    Tools run at the same time, except the EXCLUSIVE ones that run afterwards one by one'''
+
+    if build_artifacts_helper is None:
+        # Same status and results conf as a failed assessment
+        for tool_run in tool_runs:
+            LogTaskStatus.log_task('assess', 1,
+                                   _get_task_msg(tool_run.name, 'build summary not usable'))
+            _write_results_conf(tool_run.name, output_root_dir,
+                                tool_run.results_root_dir, 1, None)
+
+        return [ToolAssessment(tool_run.name, 1, None, tool_run.results_root_dir)
+                for tool_run in tool_runs]
+
+    tool_assessments = dict()
+    concurrent_tools = [(tool_run, swa_tool) for tool_run, swa_tool in zip(tool_runs, tools)
+                        if not swa_tool.EXCLUSIVE]
+
+    if len(concurrent_tools) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(concurrent_tools)) as executor:
+            futures = {executor.submit(_assess_tool, swa_tool, tool_run.name, output_root_dir,
+                                       tool_run.results_root_dir, build_artifacts_helper): tool_run.name
+                       for tool_run, swa_tool in concurrent_tools}
+
+            for future in concurrent.futures.as_completed(futures):
+                tool_assessments[futures[future]] = future.result()
+
+    for tool_run, swa_tool in zip(tool_runs, tools):
+        if tool_run.name not in tool_assessments:
+            tool_assessments[tool_run.name] = _assess_tool(swa_tool,
+                                                           tool_run.name,
+                                                           output_root_dir,
+                                                           tool_run.results_root_dir,
+                                                           build_artifacts_helper)
+
+    return [tool_assessments[tool_run.name] for tool_run in tool_runs]
+
+
+def assess(input_root_dir, output_root_dir, tool_root_dir,
+           results_root_dir, build_summary_file):
+    '''Runs every tool in get_tool_conf_files on the build, returns a list of ToolAssessment'''
 
-            with LogTaskStatus('results-archive'):
-                results_archive = shutil.make_archive(osp.join(output_root_dir, 'results'),
-                                                      'gztar',
-                                                      osp.dirname(results_root_dir),
-                                                      osp.basename(results_root_dir))
+    tool_runs = get_tool_runs(input_root_dir, tool_root_dir, results_root_dir)
+    build_artifacts_helper = get_build_artifacts_helper(build_summary_file)
 
-                results_conf['results-archive'] = osp.basename(results_archive)
-                results_conf['results-dir'] = osp.basename(results_root_dir)
+    if build_artifacts_helper is None:
+        return assess_tools(output_root_dir, tool_runs, None, None)
 
-                utillib.write_to_file(osp.join(output_root_dir, 'results.conf'),
-                                      results_conf)
+    tools = install_tools(input_root_dir, tool_runs, build_artifacts_helper)
 
-    return (exit_code, assessment_summary_file)
+    return assess_tools(output_root_dir, tool_runs, tools, build_artifacts_helper)
@@ -48,7 +48,15 @@ class AssessmentSummary:
         AssessmentSummary._add(self._root, 'tool-version', tool_conf['tool-version'])
         AssessmentSummary._add(self._root, 'platform-name', utillib.platform())
         AssessmentSummary._add(self._root, 'start-ts', utillib.posix_epoch())
-        self._assessment_artifacts = AssessmentSummary._add(self._root, 'assessment-artifacts')
+
+        # The elements are written to the file as they are added, the
+        # assessments inside <assessment-artifacts>, which is open until
+        # __exit__. Root elements added later (<base-environment>)
+        # are written after it
+        self._writer = utillib.XmlStreamWriter(filename, 'assessment-summary')
+        self._writer.write_children(self._root)
+        self._writer.start('assessment-artifacts')
+        self._assessment_artifacts = ET.Element('assessment-artifacts')
 
     def __enter__(self):
         return self
@@ -60,46 +68,72 @@ class AssessmentSummary:
             elem.text = text
         return elem
 
+    @classmethod
+    def _add_output(cls, parent, tag, filename, outputs):
+        '''outputs is CmdResult.outputs, adds the size the command wrote'''
+
+        output_file = utillib.get_output_file(outputs, filename)
+
+        if osp.isfile(output_file):
+            output_elem = AssessmentSummary._add(parent, tag, osp.basename(output_file))
+
+            if outputs and filename in outputs:
+                output_elem.set('size', str(outputs[filename].size))
+                if outputs[filename].truncated:
+                    output_elem.set('truncated', utillib.bool_to_string(True))
+
+    @classmethod
+    def _add_resource_usage(cls, parent, usage):
+        if usage is not None:
+            usage_elem = AssessmentSummary._add(parent, 'resource-usage')
+            for tag, text in utillib.resource_usage_items(usage):
+                AssessmentSummary._add(usage_elem, tag, text)
+
     def __exit__(self, exception_type, value, traceback):
-        AssessmentSummary._add(self._root, 'stop-ts', utillib.posix_epoch())
+        self._writer.write_children(self._assessment_artifacts)
+        self._writer.end()
 
-        tree = ET.ElementTree(self._root)
-        tree.write(self._filename, encoding='UTF-8', xml_declaration=True)
+        AssessmentSummary._add(self._root, 'stop-ts', utillib.posix_epoch())
+        self._writer.write_children(self._root)
+        self._writer.close()
 
     def add_non_assessment(self, build_artifact_id, cmd, exit_code,
                            execution_successful, environ, cwd, report, stdout, 
-                           stderr, starttime, endtime):
+                           stderr, starttime, endtime, usage=None, timed_out=False,
+                   outputs=None):
         non_assess_elem = AssessmentSummary._add(self._assessment_artifacts, 'non-assessment')
 
         if build_artifact_id:
             AssessmentSummary._add(non_assess_elem, 'build-artifact-id',
                                    str(build_artifact_id) if isinstance(build_artifact_id, int)
                                    else build_artifact_id)
-        if osp.isfile(stdout):
-            AssessmentSummary._add(non_assess_elem, 'stdout', osp.basename(stdout))
-        if osp.isfile(stderr):
-            AssessmentSummary._add(non_assess_elem, 'stderr', osp.basename(stderr))
+        AssessmentSummary._add_output(non_assess_elem, 'stdout', stdout, outputs)
+        AssessmentSummary._add_output(non_assess_elem, 'stderr', stderr, outputs)
         AssessmentSummary._add(non_assess_elem, 'exit-code', str(exit_code))
+        if timed_out:
+            AssessmentSummary._add(non_assess_elem, 'timed-out', utillib.bool_to_string(timed_out))
         AssessmentSummary._add(non_assess_elem, 'execution-successful',
                 utillib.bool_to_string(execution_successful))
         AssessmentSummary._add(non_assess_elem, 'start-ts', starttime)
         AssessmentSummary._add(non_assess_elem, 'stop-ts', endtime)
+        AssessmentSummary._add_resource_usage(non_assess_elem, usage)
 
         cmd_elem = AssessmentSummary._add(non_assess_elem, 'command')
 
         AssessmentSummary._add(cmd_elem, 'cwd', cwd)
-        env_elem = AssessmentSummary._add(cmd_elem, 'environment')
-        for key in environ.keys():
-            AssessmentSummary._add(env_elem, 'env', '{0}={1}'.format(key, environ[key]))
+        utillib.add_environment(self._root, cmd_elem, environ)
 
         AssessmentSummary._add(cmd_elem, 'executable', cmd[0])
         args_elem = AssessmentSummary._add(cmd_elem, 'args')
         for arg in cmd:
             AssessmentSummary._add(args_elem, 'arg', arg)
 
+        self._writer.write_children(self._assessment_artifacts)
+
     def add_report(self, build_artifact_id, cmd, exit_code,
                    execution_successful, environ, cwd, report, stdout,
-                   stderr, starttime, endtime):
+                   stderr, starttime, endtime, usage=None, timed_out=False,
+                   outputs=None):
 
         assess_elem = AssessmentSummary._add(self._assessment_artifacts, 'assessment')
         if build_artifact_id:
@@ -108,24 +142,25 @@ class AssessmentSummary:
                                    else build_artifact_id)
         if osp.isfile(report):
             AssessmentSummary._add(assess_elem, 'report', osp.basename(report))
-        if osp.isfile(stdout):
-            AssessmentSummary._add(assess_elem, 'stdout', osp.basename(stdout))
-        if osp.isfile(stderr):
-            AssessmentSummary._add(assess_elem, 'stderr', osp.basename(stderr))
+        AssessmentSummary._add_output(assess_elem, 'stdout', stdout, outputs)
+        AssessmentSummary._add_output(assess_elem, 'stderr', stderr, outputs)
         AssessmentSummary._add(assess_elem, 'exit-code', str(exit_code))
+        if timed_out:
+            AssessmentSummary._add(assess_elem, 'timed-out', utillib.bool_to_string(timed_out))
         AssessmentSummary._add(assess_elem, 'execution-successful',
                 utillib.bool_to_string(execution_successful))
         AssessmentSummary._add(assess_elem, 'start-ts', starttime)
         AssessmentSummary._add(assess_elem, 'stop-ts', endtime)
+        AssessmentSummary._add_resource_usage(assess_elem, usage)
 
         cmd_elem = AssessmentSummary._add(assess_elem, 'command')
 
         AssessmentSummary._add(cmd_elem, 'cwd', cwd)
-        env_elem = AssessmentSummary._add(cmd_elem, 'environment')
-        for key in environ.keys():
-            AssessmentSummary._add(env_elem, 'env', '{0}={1}'.format(key, environ[key]))
+        utillib.add_environment(self._root, cmd_elem, environ)
 
         AssessmentSummary._add(cmd_elem, 'executable', cmd[0])
         args_elem = AssessmentSummary._add(cmd_elem, 'args')
         for arg in cmd:
             AssessmentSummary._add(args_elem, 'arg', arg)
+
+        self._writer.write_children(self._assessment_artifacts)
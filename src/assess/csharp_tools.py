@@ -1,7 +1,6 @@
 import os
 import os.path as osp
 
-from .helper import BuildArtifactsHelper
 from .assessment_summary import AssessmentSummary
 from .swa_tool import SwaTool
 
@@ -13,8 +12,11 @@ class RoslynSecurityGuard(SwaTool):
 
     RESPONSE_FILE = 'arguments{0}.rsp'
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaTool.__init__(self, input_root_dir, tool_root_dir)
+    # Runs the compiler with analyzers in the project directory
+    EXCLUSIVE = True
+
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
         if 'analyzer-files' in self._tool_conf:
             analyzer_files = [_file for _file in self._tool_conf['analyzer-files'].split('\n')
@@ -103,17 +105,17 @@ class RoslynSecurityGuard(SwaTool):
 
 class DevskimTool(SwaTool):
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaTool.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
-    def assess(self, build_summary_file, results_root_dir):
+    def assess(self, build_artifacts_helper, results_root_dir):
 
         if not osp.isdir(results_root_dir):
             os.makedirs(results_root_dir, exist_ok=True)
 
         assessment_summary_file = osp.join(results_root_dir, 'assessment_summary.xml')
 
-        self.build_artifacts_helper = BuildArtifactsHelper(build_summary_file)
+        self.build_artifacts_helper = build_artifacts_helper
 
         passed = 0
         failed = 0
@@ -147,12 +149,15 @@ class DevskimTool(SwaTool):
 
             start_time = utillib.posix_epoch()
 
-            exit_code, environ = utillib.run_cmd(assess_cmd,
-                                                 outfile=outfile,
-                                                 errfile=errfile,
-                                                 cwd=assessment_working_dir,
-                                                 env=self._get_env(),
-                                                 description='ASSESSMENT')
+            cmd_result = utillib.run_cmd(assess_cmd,
+                                         outfile=outfile,
+                                         errfile=errfile,
+                                         cwd=assessment_working_dir,
+                                         env=self._get_env(),
+                                         description='ASSESSMENT',
+                                         timeout=self._tool_conf.get('tool-timeout'),
+                                         capture=(outfile != assessment_report))
+            exit_code, environ = cmd_result
 
             end_time = utillib.posix_epoch()
 
@@ -175,6 +180,9 @@ class DevskimTool(SwaTool):
                                           outfile,
                                           errfile,
                                           start_time,
-                                          utillib.posix_epoch())
+                                          utillib.posix_epoch(),
+                                          usage=cmd_result.usage,
+                                          timed_out=cmd_result.timed_out,
+                                          outputs=cmd_result.outputs)
 
         return (passed, failed, None, assessment_summary_file)
@@ -1,8 +1,12 @@
+import os
 import os.path as osp
 import xml.etree.ElementTree as ET
 
 from ..build.common import LANG_EXT_MAPPING
 from ..build.build_summary import BuildSummary
+from ..build.file_inventory import FileInventory
+from ..build import summary_index
+from .. import utillib
 
 
 class BuildArtifactsError(Exception):
@@ -27,33 +31,46 @@ class BuildSummaryError(Exception):
 
 class BuildArtifactsHelper:
 
+    # Elements of the build summary root that are not simple values
+    NOT_VALUES = ['package-conf',
+                  'command',
+                  'build-artifacts',
+                  'build-command',
+                  'base-environment']
+
     @classmethod
-    def _get_file_list(cls, build_root_dir, xml_elem):
-        fileset = set()
+    def _get_file_list(cls, build_root_dir, files):
+        '''files are paths relative to build_root_dir, or absolute'''
+        return list({_file if osp.isabs(_file) else osp.join(build_root_dir, _file)
+                     for _file in files})
 
-        for _file in xml_elem:
-            if not osp.isabs(_file.text):
-                fileset.add(osp.join(build_root_dir, _file.text))
-            else:
-                fileset.add(_file.text)
+    @classmethod
+    def _read_file_lists(cls, artifacts_xml_elem):
+        '''Returns a dictionary of <lang>-src to the paths in its <file> elements,
+        as they are in the build summary'''
 
-        return list(fileset)
+        lang_src = {'{0}-src'.format(lang) for lang in LANG_EXT_MAPPING.keys()}
 
-    @classmethod
-    def get_artifacts(cls, _id, build_summary, artifacts_xml_elem):
-        artifacts = dict(build_summary)
+        return {elem.tag: [_file.text for _file in elem]
+                for elem in artifacts_xml_elem if elem.tag in lang_src}
+
+    def get_artifacts(self, _id, file_lists, file_types=None):
+        '''file_types are the <lang>-src and srcfile the tool uses, all if None.
+        The absolute file lists are made only for those'''
 
+        artifacts = dict(self._build_summary)
         artifacts['id'] = _id
-        #artifacts['srcfile'] = list()
 
-        lang_src = {'{0}-src'.format(lang) for lang in LANG_EXT_MAPPING.keys()}
-        
-        for elem in artifacts_xml_elem:
+        # file_lists may read the files of a tag only when it is asked for
+        for tag in file_lists:
+            if file_types is None or tag in file_types or 'srcfile' in file_types:
+                # Made once, every tool gets its own copy
+                if (_id, tag) not in self._file_lists:
+                    self._file_lists[(_id, tag)] = \
+                        BuildArtifactsHelper._get_file_list(artifacts['build-root-dir'],
+                                                            file_lists[tag])
 
-            if elem.tag in lang_src:
-                fileset = BuildArtifactsHelper._get_file_list(artifacts['build-root-dir'], elem)
-                artifacts[elem.tag] = fileset
-                #artifacts['srcfile'].extend(fileset)
+                artifacts[tag] = list(self._file_lists[(_id, tag)])
 
         return artifacts
 
@@ -84,38 +101,69 @@ class BuildArtifactsHelper:
             artifacts['library'] = [_file.text for _file in library.iter('file')]
 
         return artifacts
-    
-    @classmethod
-    def _get_build_summary(cls, root):
-        '''returns a dictionary'''
-        return {elem.tag: elem.text for elem in root
-                if(elem.tag not in ['package-conf',
-                                    'command',
-                                    'build-artifacts',
-                                    'build-command'])}
+
+    def _read_root_elem(self, elem):
+
+        if elem.tag == 'package-conf':
+            self._package_conf = {child.tag: child.text for child in elem}
+        elif elem.tag == 'build-artifacts':
+            # Only the paths of pkg-src are kept, dotnet-compile is small
+            self._build_artifacts = [(child.tag,
+                                      BuildArtifactsHelper._read_file_lists(child)
+                                      if child.tag == BuildSummary.PKG_SRC_TAG else child)
+                                     for child in elem]
+        elif elem.tag not in BuildArtifactsHelper.NOT_VALUES:
+            self._build_summary[elem.tag] = elem.text
 
     def __init__(self, build_summary_file):
 
-        root = ET.parse(build_summary_file).getroot()
+        self._build_summary_file = build_summary_file
+        self._build_summary = dict()
+        self._build_artifacts = None
+        self._package_conf = dict()
+        self._file_lists = dict()
+        self._file_inventory = None
 
-        if root.tag != 'build-summary':
-            raise BuildSummaryError('build-summary', build_summary_file)
+        index = summary_index.read(build_summary_file)
 
-        if root.find('exit-code') is None:
+        if index is not None:
+            summary, self._package_conf, self._build_artifacts = index
+            self._build_summary = {key: value for key, value in summary.items()
+                                   if key not in BuildArtifactsHelper.NOT_VALUES}
+        else:
+            self._read_build_summary(build_summary_file)
+
+        if 'exit-code' not in self._build_summary:
             raise BuildSummaryError('exit-code', build_summary_file)
-        elif int(root.find('exit-code').text) != 0:
+        elif int(self._build_summary['exit-code']) != 0:
             raise BuildArtifactsError('exit-code not 0 in ' + build_summary_file)
 
-        if root.find('build-root-dir') is None:
+        if 'build-root-dir' not in self._build_summary:
             raise BuildSummaryError('build-root-dir', build_summary_file)
 
-        if root.find('build-artifacts') is None:
+        if self._build_artifacts is None:
             raise BuildArtifactsError("No  Source Files or Class Files to Assess! "
                                       "Looks like no files with 'rb' extension were found.")
 
-        self._build_summary = BuildArtifactsHelper._get_build_summary(root)
-        self._build_artifacts = root.find('build-artifacts')
-        self._package_conf = {elem.tag: elem.text for elem in root.find('package-conf')}
+    def _read_build_summary(self, build_summary_file):
+
+        # The elements of the root are dropped once read,
+        # the environments of the commands are not kept
+        root = None
+        depth = 0
+
+        for event, elem in ET.iterparse(build_summary_file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                    if root.tag != 'build-summary':
+                        raise BuildSummaryError('build-summary', build_summary_file)
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1:
+                    self._read_root_elem(elem)
+                    root.clear()
 
     def __contains__(self, key):
         return True if key in self._build_summary or key in self._package_conf else False
@@ -130,25 +178,44 @@ class BuildArtifactsHelper:
 
     def get_pkg_conf(self):
         return self._package_conf
-        
-    def get_build_artifacts(self, *args):
+
+    def get_file_inventory(self):
+        '''Returns the FileInventory written in the build, None if there is none'''
+
+        if self._file_inventory is None and self._build_summary.get('file-inventory'):
+            inventory_file = osp.join(self._build_summary['build-root-dir'],
+                                      self._build_summary['file-inventory'])
+            if osp.isfile(inventory_file):
+                self._file_inventory = FileInventory.read(inventory_file,
+                                                          self._build_summary['build-root-dir'])
+
+        return self._file_inventory
+
+    def get_build_command_environs(self):
+        '''Returns the full environment of every build-command, as dictionaries.
+        They are not kept, the build summary is read again'''
+
+        root = ET.parse(self._build_summary_file).getroot()
+        return [utillib.read_environment(root, elem.find('environment'))
+                for elem in root.iter('build-command')]
+
+    def get_build_artifacts(self, *args, file_types=None):
         ''' this is a generator function
         parses through the xml elements in the tree and
-        yeilds objects artifacts that we are interested in provided as a parameter'''
+        yeilds objects artifacts that we are interested in provided as a parameter.
+        file_types, see get_artifacts'''
 
         count = 1
 
-        for elem in self._build_artifacts:
+        for tag, elem in self._build_artifacts:
 
             artifacts = None
 
-            if elem.tag == BuildSummary.PKG_SRC_TAG:
+            if tag == BuildSummary.PKG_SRC_TAG:
             #if (elem.tag == BuildSummary.PKG_SRC_TAG) and (elem.tag in args):
-                artifacts = BuildArtifactsHelper.get_artifacts(count,
-                                                               self._build_summary,
-                                                               elem)
+                artifacts = self.get_artifacts(count, elem, file_types)
 
-            elif elem.tag == 'dotnet-compile':
+            elif tag == 'dotnet-compile':
             #elif (elem.tag == 'dotnet-compile') and (elem.tag in args):
                 artifacts = BuildArtifactsHelper.get_dotnet_artifacts(count,
                                                                       self._build_summary,
@@ -159,7 +226,7 @@ class BuildArtifactsHelper:
                 lang_src = {'{0}-src'.format(lang) for lang in LANG_EXT_MAPPING.keys()}
                 all_src_files = list()
 
-                if elem.tag == 'dotnet-compile':
+                if tag == 'dotnet-compile':
                     proj_dir = osp.dirname(artifacts['project-file'])
                     for file_type in artifacts.keys():
                         if file_type in lang_src:
@@ -178,3 +245,18 @@ class BuildArtifactsHelper:
 
             count += 1
 
+
+_helpers = dict()
+
+
+def load_build_artifacts_helper(build_summary_file):
+    '''Returns the BuildArtifactsHelper for build_summary_file, shared in the
+    process, the file is read again only if it is modified'''
+
+    stat = os.stat(build_summary_file)
+    key = (osp.realpath(build_summary_file), stat.st_size, stat.st_mtime)
+
+    if key not in _helpers:
+        _helpers[key] = BuildArtifactsHelper(build_summary_file)
+
+    return _helpers[key]
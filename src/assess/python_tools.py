@@ -5,20 +5,21 @@ import subprocess
 import glob
 import logging
 
-from .helper import BuildArtifactsHelper
 from .swa_tool import SwaTool
 
 
 class PythonTool(SwaTool):
 
-    def __init__(self, input_root_dir, build_summary_file, tool_root_dir):
-        self._set_python_home(build_summary_file)
+    NEEDS_BUILD_ARTIFACTS = True
+
+    def __init__(self, input_root_dir, build_artifacts_helper, tool_root_dir,
+                 tool_conf_file=None):
+        self._set_python_home(build_artifacts_helper)
         self._set_user_site_packages()
-        SwaTool.__init__(self, input_root_dir, tool_root_dir)
-        self._get_pkg_lib(build_summary_file)
+        SwaTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
+        self._get_pkg_lib(build_artifacts_helper)
 
-    def _set_python_home(self, build_summary_file):
-        build_artifact_helper = BuildArtifactsHelper(build_summary_file)
+    def _set_python_home(self, build_artifact_helper):
         pkg_lang = build_artifact_helper['package-language']
         
         regex = re.compile('[pP]ython-(?P<version>[23])')
@@ -45,10 +46,9 @@ class PythonTool(SwaTool):
             self.user_site_packages = osp.expandvars('$HOME/.local/lib/python{0}/site-packages'.format(major_version))
             self.user_local_bin = osp.expandvars('$HOME/.local/bin')
 
-    def _get_pkg_lib(self, build_summary_file):
+    def _get_pkg_lib(self, build_artifact_helper):
         '''For setuptools and distutils package, <pkg-build-dir>/build/lib*'''
 
-        build_artifact_helper = BuildArtifactsHelper(build_summary_file)
         pkg_dir = build_artifact_helper.get_pkg_dir()
         build_dir = build_artifact_helper['build-dir']
         if build_dir:
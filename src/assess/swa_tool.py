@@ -1,14 +1,18 @@
 import os
 import os.path as osp
+import shutil
+import tempfile
 import logging
 import re
-import pdb
+import gzip
+import concurrent.futures
+from collections import namedtuple
 
-from .helper import BuildArtifactsHelper
 from .assessment_summary import AssessmentSummary
 
 from .. import gencmd
 from .. import utillib
+from .. import dircache
 from .. import fileutil
 from .. import confreader
 from ..logger import LogTaskStatus
@@ -17,6 +21,14 @@ from ..build.common import LANG_EXT_MAPPING
 from ..build.build_summary import BuildSummary
 
 
+AssessmentRun = namedtuple('AssessmentRun', ['artifacts', 'cmd', 'outfile',
+                                             'errfile', 'working_dir'])
+
+AssessmentResult = namedtuple('AssessmentResult', ['exit_code', 'environ',
+                                                   'start_time', 'end_time', 'usage',
+                                                   'timed_out', 'outputs'])
+
+
 class ToolInstallFailedError(Exception):
 
     def __init__(self, value):
@@ -31,6 +43,14 @@ class SwaToolBase:
 
     TOOL_DOT_CONF = 'tool.conf'
 
+    # Tools that modify the package directory cannot
+    # run at the same time as other tools
+    EXCLUSIVE = False
+
+    # Tools whose constructor takes the build artifacts,
+    # they are installed after the build
+    NEEDS_BUILD_ARTIFACTS = False
+
     @classmethod
     def get_services_conf(cls, tool_type, input_root_dir):
         conf_file = osp.join(input_root_dir, 'services.conf')
@@ -40,11 +60,13 @@ class SwaToolBase:
         else:
             return dict()
     
-    def __init__(self, input_root_dir, tool_root_dir):
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
 
-        tool_conf_file = osp.join(input_root_dir, SwaToolBase.TOOL_DOT_CONF)
+        tool_conf_file = osp.join(input_root_dir,
+                                  tool_conf_file or SwaToolBase.TOOL_DOT_CONF)
         self.tool_root_dir = tool_root_dir
         self.input_root_dir = input_root_dir
+        self._list_files_dir = None
 
         tool_conf = confreader.read_conf_into_dict(tool_conf_file)
 
@@ -72,7 +94,7 @@ class SwaToolBase:
 
         with LogTaskStatus('tool-unarchive'):
             tool_archive = osp.join(input_root_dir, self._tool_conf['tool-archive'])
-            exit_code = utillib.unpack_archive(tool_archive, tool_root_dir)
+            exit_code = dircache.unpack_archive(tool_archive, tool_root_dir)
 
             if exit_code != 0:
                 raise UnpackArchiveError(self._tool_conf['tool-archive'])
@@ -80,12 +102,21 @@ class SwaToolBase:
     def _get_env(self):
         new_env = dict(os.environ)
 
+        # With more than one tool, each tool is installed in its own directory
+        new_env['TOOL_ROOT_DIR'] = osp.realpath(self.tool_root_dir)
+        new_env['TOOL_DIR'] = new_env['TOOL_ROOT_DIR']
+
         if 'tool-env' in self._tool_conf:
             tool_env = self._tool_conf['tool-env']
             new_env.update(((var_val.partition('=')[0], var_val.partition('=')[2])
                             for var_val in tool_env.split(',')))
         return new_env
 
+    def _can_cache_install(self):
+        '''The install cache keeps only the tool directory, a tool.conf whose
+        install command writes nowhere else sets 'tool-install-cache' to true'''
+        return utillib.string_to_bool(self._tool_conf.get('tool-install-cache', 'false').lower())
+
     def _install(self, input_root_dir, tool_root_dir):
 
         with LogTaskStatus('tool-install') as status_dot_out:
@@ -99,12 +130,37 @@ class SwaToolBase:
             else:
 
                 install_cmd = self._tool_conf['tool-install-cmd']
+                tool_dir = osp.join(tool_root_dir, self._tool_conf['tool-dir'])
+                install_cache = dircache.get_cache('tool-install') \
+                                if self._can_cache_install() else None
 
-                exit_code, _ = utillib.run_cmd(install_cmd,
-                                               cwd=osp.join(tool_root_dir,
-                                                            self._tool_conf['tool-dir']),
-                                               env=self._get_env(),
-                                               description='TOOL INSTALL')
+                if install_cache is None:
+                    exit_code = self._run_install_cmd(install_cmd, tool_dir)
+                else:
+                    tool_archive = osp.join(input_root_dir, self._tool_conf['tool-archive'])
+
+                    # Installed files can have absolute paths (scripts, .pth files),
+                    # so the tool dir is also part of the key
+                    key = dircache.make_key(dircache.file_digest(tool_archive),
+                                            install_cmd,
+                                            self._tool_conf.get('tool-env', ''),
+                                            utillib.platform(),
+                                            tool_dir)
+
+                    # Holding the entry lock, only one job installs and populates the entry
+                    with install_cache.entry(key) as entry:
+                        if entry.exists():
+                            logging.info('TOOL INSTALL CACHE HIT %s', tool_dir)
+                            shutil.rmtree(tool_dir)
+                            # Never hardlink, the tool may modify its files in place
+                            entry.restore(tool_dir,
+                                          'copy' if entry.link_mode == 'hardlink' else None)
+                            exit_code = 0
+                            status_dot_out.update_task_status(exit_code, 'cached')
+                        else:
+                            exit_code = self._run_install_cmd(install_cmd, tool_dir)
+                            if exit_code == 0:
+                                entry.store(tool_dir)
 
                 if exit_code != 0:
                     raise ToolInstallFailedError("Install Tool Failed, "
@@ -118,6 +174,20 @@ class SwaToolBase:
                                                                                 self._tool_conf['tool-dir'],
                                                                                 self._tool_conf['tool-flow-typed-executable']))
 
+    def _run_install_cmd(self, install_cmd, tool_dir):
+        exit_code, _ = utillib.run_cmd(install_cmd,
+                                       cwd=tool_dir,
+                                       env=self._get_env(),
+                                       description='TOOL INSTALL')
+        return exit_code
+
+    def remove_list_files(self):
+        '''Removes the list files of 'tool-list-file', see SwaTool._write_list_files'''
+
+        if self._list_files_dir is not None:
+            shutil.rmtree(self._list_files_dir, ignore_errors=True)
+            self._list_files_dir = None
+
     def _validate_exit_code(self, exit_code):
         if 'valid-exit-status' in self._tool_conf:
             valid_exit_codes = [int(ec.strip())
@@ -131,7 +201,7 @@ class SwaToolBase:
     def get_tool_target_artifacts(self):
         return self._tool_conf.get('tool-target-artifacts', BuildSummary.PKG_SRC_TAG)
 
-    def assess(self, build_summary_file, results_root_dir):
+    def assess(self, build_artifacts_helper, results_root_dir):
         raise NotImplementedError
 
 
@@ -159,7 +229,7 @@ class SwaTool(SwaToolBase):
         if osp.isfile(errfile):
             errmsg_regex = re.compile(errmsg)
             line_num = 1
-            with open(errfile) as fobj:
+            with (gzip.open(errfile, 'rt') if errfile.endswith('.gz') else open(errfile)) as fobj:
                 for line in fobj:
                     if errmsg_regex.search(line.strip()):
                         msg += '{0}:{1}: {2}\n'.format('/'.join(errfile.split('/')[-2:]),
@@ -168,8 +238,8 @@ class SwaTool(SwaToolBase):
 
         return msg
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaToolBase.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaToolBase.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
     def _has_no_artifacts(self, invoke_file, artifacts):
         ''' Each tool works on certain types of files such as html, css, javascript.
@@ -179,6 +249,31 @@ class SwaTool(SwaToolBase):
         return not any(True if var.name in artifacts and artifacts[var.name] else False
                        for var in SwaTool._get_tool_target_filetypes(invoke_file))
 
+    def _write_list_files(self, artifacts, file_types):
+        '''For tools that read the files to assess from a file, 'tool-list-file'
+        is true in tool.conf. The files of each of file_types are written
+        to a list file, one per line, and the parameter becomes the list file,
+        prefixed with 'tool-list-file-prefix' (for instance '@' for csc)'''
+
+        prefix = self._tool_conf.get('tool-list-file-prefix', '')
+
+        # Not in the results, removed after the assessment (remove_list_files)
+        if self._list_files_dir is None:
+            self._list_files_dir = tempfile.mkdtemp(prefix='swamp-list-files-')
+
+        for file_type in file_types:
+            if artifacts[file_type]:
+                list_file = osp.join(self._list_files_dir,
+                                     '{0}{1}.list'.format(file_type, artifacts['build-artifact-id']))
+
+                with open(list_file, 'w') as fobj:
+                    for _file in artifacts[file_type]:
+                        print(_file, file=fobj)
+
+                artifacts[file_type] = [prefix + list_file]
+
+        return artifacts
+
     def _split_build_artifacts(self, artifacts):
         '''Splits only if required'''
 
@@ -197,10 +292,16 @@ class SwaTool(SwaToolBase):
         package_artifacts = {var.name: artifacts[var.name] for var in tool_target_filetypes
                              if var.name in artifacts}
 
+        # The tool runs once on the whole package
+        if utillib.string_to_bool(self._tool_conf.get('tool-list-file', 'false').lower()):
+            yield self._write_list_files(artifacts, package_artifacts.keys())
+            return
+
         (split_required,
          max_cmd_size) = fileutil.is_chunking_commands_required(tool_invoke_file,
                                                                 artifacts,
-                                                                package_artifacts.keys())
+                                                                package_artifacts.keys(),
+                                                                self._get_env())
 
         if split_required:
 
@@ -227,9 +328,16 @@ class SwaTool(SwaToolBase):
         else:
             yield artifacts
 
+    def _get_file_types(self):
+        '''The <lang>-src and srcfile that the tool-invoke file uses'''
+        return [var.name for var in
+                SwaTool._get_tool_target_filetypes(osp.join(self.input_root_dir,
+                                                            self._tool_conf['tool-invoke']))]
+
     def _get_build_artifacts(self, build_artifacts_helper, results_root_dir):
 
-        for artifacts in build_artifacts_helper.get_build_artifacts(self.get_tool_target_artifacts()):
+        for artifacts in build_artifacts_helper.get_build_artifacts(self.get_tool_target_artifacts(),
+                                                                    file_types=self._get_file_types()):
             artifacts['build-artifact-id'] = artifacts['id']
             artifacts['results-root-dir'] = results_root_dir
             artifacts.update(self._tool_conf)
@@ -254,13 +362,109 @@ class SwaTool(SwaToolBase):
             else:
                 status_dot_out.skip_task()
                     
-    def assess(self, build_summary_file, results_root_dir):
+    def _get_assessment_runs(self, build_artifacts_helper, results_root_dir):
+        '''this is a generator function,
+        yields an AssessmentRun for every chunk of artifacts that has to be assessed'''
+
+        for artifacts in self._get_build_artifacts(build_artifacts_helper,
+                                                   results_root_dir):
+
+            if 'report-on-stdout' in artifacts \
+               and artifacts['report-on-stdout'] == 'true':
+                outfile = artifacts['assessment-report']
+            else:
+                outfile = osp.join(results_root_dir,
+                                   'swa_tool_stdout{0}.out'.format(artifacts['build-artifact-id']))
+
+            if 'report-on-stderr' in artifacts \
+               and artifacts['report-on-stderr'] == 'true':
+                errfile = artifacts['assessment-report']
+            else:
+                errfile = osp.join(results_root_dir,
+                                   'swa_tool_stderr{0}.out'.format(artifacts['build-artifact-id']))
+
+            assessment_working_dir = artifacts.get('assessment-working-dir',
+                                                   build_artifacts_helper.get_pkg_dir())
+
+            invoke_file = osp.join(self.input_root_dir, artifacts['tool-invoke'])
+
+            # SKIP Assessment if there are no artifacts relavent to the tool
+            if self._has_no_artifacts(invoke_file, artifacts):
+                logging.info('ASSESSMENT SKIP (NO SOURCE FILES FOUND)')
+            else:
+                yield AssessmentRun(artifacts,
+                                    gencmd.gencmd(invoke_file, artifacts),
+                                    outfile,
+                                    errfile,
+                                    assessment_working_dir)
+
+    def _run_assessment(self, assessment_run):
+        '''Runs the tool on one chunk, returns an AssessmentResult'''
+
+        # Reports written to stdout or stderr are kept as they are
+        report = assessment_run.artifacts['assessment-report']
+
+        start_time = utillib.posix_epoch()
+        cmd_result = utillib.run_cmd(assessment_run.cmd,
+                                     outfile=assessment_run.outfile,
+                                     errfile=assessment_run.errfile,
+                                     cwd=assessment_run.working_dir,
+                                     env=self._get_env(),
+                                     description='ASSESSMENT',
+                                     timeout=self._tool_conf.get('tool-timeout'),
+                                     capture=report not in [assessment_run.outfile,
+                                                            assessment_run.errfile])
+        end_time = utillib.posix_epoch()
+
+        return AssessmentResult(cmd_result.exit_code, cmd_result.environ,
+                                start_time, end_time, cmd_result.usage,
+                                cmd_result.timed_out, cmd_result.outputs)
+
+    @classmethod
+    def _get_chunk_size(cls, assessment_run, file_sizes):
+        '''Total size in bytes of the files in the command, used to start
+        the longest running chunks first. file_sizes has the sizes of the
+        package files from the file inventory, other files are looked at'''
+        return sum(file_sizes[arg] if arg in file_sizes else osp.getsize(arg)
+                   for arg in assessment_run.cmd[1:]
+                   if arg in file_sizes or osp.isfile(arg))
+
+    def _run_assessments(self, assessment_runs, file_inventory=None):
+        '''Runs all the chunks, at most 'tool-max-jobs' at a time.
+        Returns a list of AssessmentResult in the same order as assessment_runs'''
+
+        max_jobs = min(utillib.get_max_jobs(self._tool_conf.get('tool-max-jobs')),
+                       len(assessment_runs))
+
+        if max_jobs <= 1:
+            return [self._run_assessment(assessment_run)
+                    for assessment_run in assessment_runs]
+
+        logging.info('ASSESSMENT MAX JOBS %d', max_jobs)
+
+        # Longest chunk first, so that a big chunk does not start last
+        # and keep the other workers idle at the end
+        file_sizes = file_inventory.get_file_sizes() if file_inventory else dict()
+        order = sorted(range(len(assessment_runs)),
+                       key=lambda i: SwaTool._get_chunk_size(assessment_runs[i], file_sizes),
+                       reverse=True)
+
+        results = [None] * len(assessment_runs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs) as executor:
+            futures = {executor.submit(self._run_assessment, assessment_runs[i]): i
+                       for i in order}
+
+            for future in concurrent.futures.as_completed(futures):
+                results[futures[future]] = future.result()
+
+        return results
+
+    def assess(self, build_artifacts_helper, results_root_dir):
 
         if not osp.isdir(results_root_dir):
             os.makedirs(results_root_dir, exist_ok=True)
 
         assessment_summary_file = osp.join(results_root_dir, 'assessment_summary.xml')
-        build_artifacts_helper = BuildArtifactsHelper(build_summary_file)
         self._set_tool_config(build_artifacts_helper.get_pkg_dir())
 
         logging.info('TOOL CONF: %s', self._tool_conf)
@@ -273,73 +477,51 @@ class SwaTool(SwaToolBase):
                                build_artifacts_helper,
                                self._tool_conf) as assessment_summary:
 
-            for artifacts in self._get_build_artifacts(build_artifacts_helper,
-                                                       results_root_dir):
+            assessment_runs = list(self._get_assessment_runs(build_artifacts_helper,
+                                                             results_root_dir))
 
-                if 'report-on-stdout' in artifacts \
-                   and artifacts['report-on-stdout'] == 'true':
-                    outfile = artifacts['assessment-report']
-                else:
-                    outfile = osp.join(results_root_dir,
-                                       'swa_tool_stdout{0}.out'.format(artifacts['build-artifact-id']))
+            assessment_results = self._run_assessments(assessment_runs,
+                                                       build_artifacts_helper.get_file_inventory())
 
-                if 'report-on-stderr' in artifacts \
-                   and artifacts['report-on-stderr'] == 'true':
-                    errfile = artifacts['assessment-report']
-                else:
-                    errfile = osp.join(results_root_dir,
-                                       'swa_tool_stderr{0}.out'.format(artifacts['build-artifact-id']))
-                    
-                assessment_working_dir = artifacts.get('assessment-working-dir',
-                                                       build_artifacts_helper.get_pkg_dir())
-                    
-                invoke_file = osp.join(self.input_root_dir, artifacts['tool-invoke'])
-                skip_assess = self._has_no_artifacts(invoke_file, artifacts)
-
-                # SKIP Assessment if there are no artifacts relavent to the tool
-                if not skip_assess:
-                    start_time = utillib.posix_epoch()
-                    assess_cmd = gencmd.gencmd(invoke_file, artifacts)
-
-                    exit_code, environ = utillib.run_cmd(assess_cmd,
-                                                         outfile=outfile,
-                                                         errfile=errfile,
-                                                         cwd=assessment_working_dir,
-                                                         env=self._get_env(),
-                                                         description='ASSESSMENT')
-
-                    assessment_report = artifacts['assessment-report'] \
-                                        if outfile != artifacts['assessment-report'] else outfile
-
-                    end_time = utillib.posix_epoch()
-
-                    if self._validate_exit_code(exit_code):
-                        passed += 1
-                        execution_successful = True
-                    else:
-                        failed += 1
-                        execution_successful = False
-                        if ('tool-report-exit-code' in self._tool_conf) and \
-                           (exit_code == int(self._tool_conf['tool-report-exit-code'])):
-
-                            if self._tool_conf['tool-type'] == 'phpmd':
-                                error_msgs += SwaTool._read_err_msg(outfile,
-                                                                    self._tool_conf['tool-report-exit-code-msg'])
-
-                    # write assessment summary file
-                    # return pass, fail, assessment_summary
-                    assessment_summary.add_report(artifacts['build-artifact-id'],
-                                                  assess_cmd,
-                                                  exit_code,
-                                                  execution_successful,
-                                                  environ,
-                                                  assessment_working_dir,
-                                                  assessment_report,
-                                                  outfile,
-                                                  errfile,
-                                                  start_time,
-                                                  end_time)
+            # Summary entries are added in the order of the chunks,
+            # irrespective of the order in which they finished
+            for assessment_run, result in zip(assessment_runs, assessment_results):
+
+                artifacts = assessment_run.artifacts
+                outfile = assessment_run.outfile
+
+                assessment_report = artifacts['assessment-report'] \
+                                    if outfile != artifacts['assessment-report'] else outfile
+
+                if self._validate_exit_code(result.exit_code):
+                    passed += 1
+                    execution_successful = True
                 else:
-                    logging.info('ASSESSMENT SKIP (NO SOURCE FILES FOUND)')
+                    failed += 1
+                    execution_successful = False
+                    if ('tool-report-exit-code' in self._tool_conf) and \
+                       (result.exit_code == int(self._tool_conf['tool-report-exit-code'])):
+
+                        if self._tool_conf['tool-type'] == 'phpmd':
+                            error_msgs += SwaTool._read_err_msg(utillib.get_output_file(result.outputs,
+                                                                                        outfile),
+                                                                self._tool_conf['tool-report-exit-code-msg'])
+
+                # write assessment summary file
+                # return pass, fail, assessment_summary
+                assessment_summary.add_report(artifacts['build-artifact-id'],
+                                              assessment_run.cmd,
+                                              result.exit_code,
+                                              execution_successful,
+                                              result.environ,
+                                              assessment_run.working_dir,
+                                              assessment_report,
+                                              outfile,
+                                              assessment_run.errfile,
+                                              result.start_time,
+                                              result.end_time,
+                                              usage=result.usage,
+                                              timed_out=result.timed_out,
+                                              outputs=result.outputs)
 
             return (passed, failed, error_msgs, assessment_summary_file)
@@ -6,7 +6,6 @@ import fnmatch
 import yaml
 import json
 
-from .helper import BuildArtifactsHelper
 from .assessment_summary import AssessmentSummary
 from .swa_tool import SwaToolBase
 from .swa_tool import SwaTool
@@ -23,36 +22,43 @@ class JsTool(SwaTool):
 
     #FILE_TYPE = 'javascript'
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaTool.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
 
 class PhpTool(SwaTool):
 
     #FILE_TYPE = 'php'
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaTool.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
 
 class Lizard(SwaTool):
 
     # FILE_TYPE = 'srcfile'
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaTool.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
     def _get_build_artifacts(self, build_artifacts_helper, results_root_dir):
 
-        for artifacts in build_artifacts_helper.get_build_artifacts(BuildSummary.PKG_SRC_TAG):
+        file_types = self._get_file_types() + ['css-src', 'xml-src']
+
+        for artifacts in build_artifacts_helper.get_build_artifacts(BuildSummary.PKG_SRC_TAG,
+                                                                    file_types=file_types):
             artifacts['build-artifact-id'] = artifacts['id']
             artifacts['results-root-dir'] = results_root_dir
             artifacts.update(self._tool_conf)
             artifacts['assessment-report'] = osp.join(artifacts['results-root-dir'],
                                                       artifacts['assessment-report-template'].format(artifacts['build-artifact-id']))
 
+            # The build has already sorted the files by language.
+            # Lizard does not take CSS and XML files, they were given to it
+            # before because the extension check was against '.css.xml'
+            skip_files = set(artifacts.get('css-src', [])).union(artifacts.get('xml-src', []))
             artifacts[SwaTool.FILE_TYPE] = [_file for _file in artifacts[SwaTool.FILE_TYPE]
-                                            if osp.splitext(_file)[1] not in ['.css' '.xml']]
+                                            if _file not in skip_files]
 
             for new_artifacts in self._split_build_artifacts(artifacts):
                 yield new_artifacts
@@ -60,8 +66,11 @@ class Lizard(SwaTool):
 
 class Flow(SwaToolBase):
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaToolBase.__init__(self, input_root_dir, tool_root_dir)
+    # Writes .flowconfig and flow-typed files in the package directory
+    EXCLUSIVE = True
+
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaToolBase.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
     @classmethod
     def _convert_to_regex(cls, pattern):
@@ -146,12 +155,14 @@ class Flow(SwaToolBase):
                 flowtyped_errfile = osp.join(results_root_dir,
                                              'flow_typed_stderr{0}.out'.format(artifacts['id']))
 
-                flowtyped_exit_code, flowtyped_environ = utillib.run_cmd(flowtyped_cmd,
-                                                                         outfile=flowtyped_outfile,
-                                                                         errfile=flowtyped_errfile,
-                                                                         cwd=assessment_working_dir,
-                                                                         env=self._get_env(),
-                                                                         description='FLOW_TYPED')
+                flowtyped_result = utillib.run_cmd(flowtyped_cmd,
+                                                   outfile=flowtyped_outfile,
+                                                   errfile=flowtyped_errfile,
+                                                   cwd=assessment_working_dir,
+                                                   env=self._get_env(),
+                                                   description='FLOW_TYPED',
+                                                   timeout=self._tool_conf.get('tool-timeout'))
+                flowtyped_exit_code, flowtyped_environ = flowtyped_result
 
                 if flowtyped_exit_code == 0:
                     ft_execution_successful = True
@@ -168,18 +179,21 @@ class Flow(SwaToolBase):
                                                       flowtyped_outfile,
                                                       flowtyped_errfile,
                                                       flowtyped_start_time,
-                                                      utillib.posix_epoch())
+                                                      utillib.posix_epoch(),
+                                                      usage=flowtyped_result.usage,
+                                                      timed_out=flowtyped_result.timed_out,
+                                                      outputs=flowtyped_result.outputs)
                 
                 status_dot_out.update_task_status(flowtyped_exit_code)
 
-    def assess(self, build_summary_file, results_root_dir):
+    def assess(self, build_artifacts_helper, results_root_dir):
 
         if not osp.isdir(results_root_dir):
             os.makedirs(results_root_dir, exist_ok=True)
 
         assessment_summary_file = osp.join(results_root_dir, 'assessment_summary.xml')
 
-        self.build_artifacts_helper = BuildArtifactsHelper(build_summary_file)
+        self.build_artifacts_helper = build_artifacts_helper
 
         passed = 0
         failed = 0
@@ -219,12 +233,15 @@ class Flow(SwaToolBase):
 
             start_time = utillib.posix_epoch()
 
-            exit_code, environ = utillib.run_cmd(assess_cmd,
-                                                 outfile=outfile,
-                                                 errfile=errfile,
-                                                 cwd=assessment_working_dir,
-                                                 env=self._get_env(),
-                                                 description='ASSESSMENT')
+            cmd_result = utillib.run_cmd(assess_cmd,
+                                         outfile=outfile,
+                                         errfile=errfile,
+                                         cwd=assessment_working_dir,
+                                         env=self._get_env(),
+                                         description='ASSESSMENT',
+                                         timeout=self._tool_conf.get('tool-timeout'),
+                                         capture=(outfile != assessment_report))
+            exit_code, environ = cmd_result
 
             end_time = utillib.posix_epoch()
 
@@ -247,15 +264,18 @@ class Flow(SwaToolBase):
                                           outfile,
                                           errfile,
                                           start_time,
-                                          end_time)
+                                          end_time,
+                                          usage=cmd_result.usage,
+                                          timed_out=cmd_result.timed_out,
+                                          outputs=cmd_result.outputs)
 
         return (passed, failed, None, assessment_summary_file)
 
 
 class Retire(SwaToolBase):
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        SwaToolBase.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        SwaToolBase.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
     def _install(self, input_root_dir, tool_root_dir):
 
@@ -275,14 +295,14 @@ class Retire(SwaToolBase):
                                                                   self._tool_conf['tool-dir'],
                                                                   self._tool_conf['executable']))
 
-    def assess(self, build_summary_file, results_root_dir):
+    def assess(self, build_artifacts_helper, results_root_dir):
 
         if not osp.isdir(results_root_dir):
             os.makedirs(results_root_dir, exist_ok=True)
 
         assessment_summary_file = osp.join(results_root_dir, 'assessment_summary.xml')
 
-        self.build_artifacts_helper = BuildArtifactsHelper(build_summary_file)
+        self.build_artifacts_helper = build_artifacts_helper
 
         passed = 0
         failed = 0
@@ -319,12 +339,15 @@ class Retire(SwaToolBase):
 
             start_time = utillib.posix_epoch()
 
-            exit_code, environ = utillib.run_cmd(assess_cmd,
-                                                 outfile=outfile,
-                                                 errfile=errfile,
-                                                 cwd=assessment_working_dir,
-                                                 env=self._get_env(),
-                                                 description='ASSESSMENT')
+            cmd_result = utillib.run_cmd(assess_cmd,
+                                         outfile=outfile,
+                                         errfile=errfile,
+                                         cwd=assessment_working_dir,
+                                         env=self._get_env(),
+                                         description='ASSESSMENT',
+                                         timeout=self._tool_conf.get('tool-timeout'),
+                                         capture=(outfile != assessment_report))
+            exit_code, environ = cmd_result
 
             end_time = utillib.posix_epoch()
 
@@ -347,15 +370,18 @@ class Retire(SwaToolBase):
                                           outfile,
                                           errfile,
                                           start_time,
-                                          end_time)
+                                          end_time,
+                                          usage=cmd_result.usage,
+                                          timed_out=cmd_result.timed_out,
+                                          outputs=cmd_result.outputs)
 
         return (passed, failed, None, assessment_summary_file)
 
 
 class Eslint(JsTool):
 
-    def __init__(self, input_root_dir, tool_root_dir):
-        JsTool.__init__(self, input_root_dir, tool_root_dir)
+    def __init__(self, input_root_dir, tool_root_dir, tool_conf_file=None):
+        JsTool.__init__(self, input_root_dir, tool_root_dir, tool_conf_file)
 
     def _config_needs_extra_modules(self, config_file):
         file_ext = osp.splitext(config_file)[-1]
@@ -0,0 +1,218 @@
+'''
+Batch mode, runs the jobs in a manifest file with a pool of worker processes.
+
+Every line of the manifest is a job, blank lines and lines starting with #
+are ignored. A line is either a job directory, that has the 'input'
+directory and gets the 'out', 'build', 'tool' and 'results' directories,
+or the five directories: input, output, build, tool and results.
+
+Each job runs in a process forked from this one, so interpreter startup,
+module imports (all the tool modules) and the gencmd lexer and parser
+(see preload) are done only once. A job has its own
+working directory, environment, debug.out, status.out and stdout.out.
+
+A job is started only if the host is not busy:
+the 1 minute load average is less than the number of CPUs, and
+the available memory is at least SWAMP_BATCH_MIN_MEMORY (suffixes K, M, G
+are allowed, default 1G). If no job is running, the next job is always started.
+'''
+
+import os
+import os.path as osp
+import sys
+import time
+import logging
+import multiprocessing
+from collections import namedtuple
+
+from . import utillib
+from . import gencmd
+from . import assess
+from . import confreader
+
+BATCH_MIN_MEMORY_ENV = 'SWAMP_BATCH_MIN_MEMORY'
+BATCH_JOB_STDOUT = 'stdout.out'
+
+BatchJob = namedtuple('BatchJob', ['job_dir', 'input_dir', 'output_dir',
+                                   'build_dir', 'tool_dir', 'results_dir'])
+
+
+def get_job(dirs):
+    '''dirs is [job_dir] or [input, output, build, tool, results], returns a BatchJob'''
+
+    if len(dirs) == 1:
+        return BatchJob(dirs[0],
+                        osp.join(dirs[0], 'input'),
+                        osp.join(dirs[0], 'out'),
+                        osp.join(dirs[0], 'build'),
+                        osp.join(dirs[0], 'tool'),
+                        osp.join(dirs[0], 'results'))
+    elif len(dirs) == 5:
+        return BatchJob(osp.dirname(dirs[0]), *dirs)
+    else:
+        raise ValueError('Expected a job directory or 5 directories, found {0}'.format(len(dirs)))
+
+
+def read_manifest(manifest_file):
+    '''Returns a list of BatchJob'''
+
+    jobs = list()
+    manifest_dir = osp.dirname(osp.realpath(manifest_file))
+
+    with open(manifest_file) as fobj:
+        for line_num, line in enumerate(fobj, 1):
+            fields = line.split()
+
+            if not fields or fields[0].startswith('#'):
+                continue
+
+            try:
+                jobs.append(get_job([osp.realpath(osp.join(manifest_dir, field))
+                                     for field in fields]))
+            except ValueError as err:
+                raise ValueError('{0}:{1}: {2}'.format(manifest_file, line_num, err))
+
+    return jobs
+
+
+def get_mem_available():
+    '''Returns the available memory in bytes, None if it is not known'''
+
+    try:
+        with open('/proc/meminfo') as fobj:
+            for line in fobj:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return None
+
+
+def can_start_job(min_memory):
+    '''Admission control, True if the host can take another job'''
+
+    if os.getloadavg()[0] >= (os.cpu_count() or 1):
+        return False
+
+    mem_available = get_mem_available()
+    if mem_available is not None and mem_available < min_memory:
+        return False
+
+    return True
+
+
+def preload():
+    '''Loads in this process what every job needs, before the jobs are forked'''
+    assess.import_tool_modules()
+    gencmd.load()
+
+
+def preload_job(job):
+    '''Parses the tool invoke files of job in this process, before it is forked.
+    The templates (gencmd.get_template) are then there for the later jobs
+    that use the same invoke files'''
+
+    try:
+        for tool_run in assess.get_tool_runs(job.input_dir, job.tool_dir, job.results_dir):
+            tool_conf = confreader.read_conf_into_dict(osp.join(job.input_dir,
+                                                                tool_run.tool_conf_file))
+            if 'tool-defaults' in tool_conf:
+                tool_defaults = confreader.read_conf_into_dict(osp.join(job.input_dir,
+                                                                        tool_conf['tool-defaults']))
+                tool_defaults.update(tool_conf)
+                tool_conf = tool_defaults
+
+            if 'tool-invoke' in tool_conf:
+                invoke_file = osp.join(job.input_dir,
+                                       utillib.expandvar(tool_conf['tool-invoke'], tool_conf))
+                if osp.isfile(invoke_file):
+                    gencmd.get_template(invoke_file)
+    except Exception as err:
+        # The job reports it, if it is a problem
+        logging.info('PRELOAD %s: %s', job.job_dir, err)
+
+
+def run_forked_job(job, run_job):
+    '''Runs in the forked process, exits with the exit code of run_job'''
+
+    # Do not write to the batch's log handlers
+    for logger_name in ['', '.status-logger']:
+        for handler in list(logging.getLogger(logger_name).handlers):
+            logging.getLogger(logger_name).removeHandler(handler)
+
+    if not osp.isdir(job.output_dir):
+        os.makedirs(job.output_dir, exist_ok=True)
+
+    os.chdir(job.job_dir)
+
+    # What a single job writes to the terminal goes to <output_dir>/stdout.out
+    with open(osp.join(job.output_dir, BATCH_JOB_STDOUT), 'w') as fobj:
+        os.dup2(fobj.fileno(), sys.stdout.fileno())
+        os.dup2(fobj.fileno(), sys.stderr.fileno())
+
+    # Every job has its own VMINPUTDIR, VMOUTPUTDIR
+    os.environ.pop('VMINPUTDIR', None)
+    os.environ.pop('VMOUTPUTDIR', None)
+
+    sys.exit(run_job(job.input_dir, job.output_dir, job.build_dir,
+                     job.tool_dir, job.results_dir))
+
+
+def main(manifest_file, max_jobs, summary_file, run_job):
+    '''run_job is called in a new process for every job with the
+    input, output, build, tool and results directories, and returns the exit code.
+    Writes summary_file and returns 0 if all the jobs passed'''
+
+    jobs = read_manifest(manifest_file)
+    max_jobs = utillib.get_max_jobs(max_jobs)
+    min_memory = utillib.parse_size(os.getenv(BATCH_MIN_MEMORY_ENV, '1G'))
+
+    logging.info('BATCH JOBS: %d, MAX JOBS: %d', len(jobs), max_jobs)
+
+    preload()
+
+    mp_context = multiprocessing.get_context('fork')
+    pending = list(enumerate(jobs))
+    running = dict()
+    exit_codes = dict()
+    job_times = dict()
+    start_time = time.time()
+
+    while pending or running:
+
+        while pending and len(running) < max_jobs \
+              and (not running or can_start_job(min_memory)):
+            job_id, job = pending.pop(0)
+            preload_job(job)
+            process = mp_context.Process(target=run_forked_job, args=(job, run_job))
+            process.start()
+            running[job_id] = (process, time.time())
+            logging.info('BATCH JOB START %d %s', job_id, job.job_dir)
+
+        time.sleep(0.2)
+
+        for job_id, (process, job_start_time) in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                exit_codes[job_id] = process.exitcode
+                job_times[job_id] = time.time() - job_start_time
+                running.pop(job_id)
+                logging.info('BATCH JOB END %d %s EXIT CODE %s',
+                             job_id, jobs[job_id].job_dir, process.exitcode)
+
+    summary = dict()
+    summary['jobs'] = len(jobs)
+    summary['passed'] = sum(1 for exit_code in exit_codes.values() if exit_code == 0)
+    summary['failed'] = len(jobs) - summary['passed']
+    summary['time'] = '{0:.6f}'.format(time.time() - start_time)
+
+    for job_id, job in enumerate(jobs):
+        summary['job-{0}-dir'.format(job_id)] = job.job_dir
+        summary['job-{0}-exit-code'.format(job_id)] = exit_codes[job_id]
+        summary['job-{0}-time'.format(job_id)] = '{0:.6f}'.format(job_times[job_id])
+
+    utillib.write_to_file(summary_file, summary)
+    logging.info('BATCH PASSED: %d, FAILED: %d', summary['passed'], summary['failed'])
+
+    return 0 if summary['failed'] == 0 else 1
@@ -11,20 +11,24 @@ from .python_package import PythonWheelPkg
 from .python_package import PythonNoBuildPkg
 from .python_package import PythonOtherPkg
 from .csharp_package import CsharpPkg
+from .build_summary import BuildSummary
 from .common import EmptyPackageError
 from .common import CommandFailedError
 
 from .. import utillib
+from .. import dircache
 from .. import confreader
 from ..logger import LogTaskStatus
 
 from ..utillib import UnpackArchiveError
 from ..utillib import NotADirectoryException
+from ..utillib import FileNotFoundException
 
 
-def get_pkg_obj(pkg_conf_file, input_root_dir, build_root_dir):
+BUILD_CACHE_DIR = 'build'
 
-    pkg_conf = confreader.read_conf_into_dict(pkg_conf_file)
+
+def get_pkg_class(pkg_conf):
 
     pkg_types = {
         'npm': JsNodePkg,
@@ -42,12 +46,124 @@ def get_pkg_obj(pkg_conf_file, input_root_dir, build_root_dir):
     build_sys = pkg_conf['build-sys']
 
     if build_sys in pkg_types.keys():
-        return pkg_types[build_sys](pkg_conf_file, input_root_dir, build_root_dir)
+        return pkg_types[build_sys]
     else:
         raise NotImplementedError("Unknown build system '{0}'".format(build_sys))
 
 
-def build(input_root_dir, output_root_dir, build_root_dir):
+def get_pkg_obj(pkg_conf_file, input_root_dir, build_root_dir):
+
+    pkg_conf = confreader.read_conf_into_dict(pkg_conf_file)
+    return get_pkg_class(pkg_conf)(pkg_conf_file, input_root_dir, build_root_dir)
+
+
+def _get_build_cache_key(input_root_dir, build_root_dir):
+    '''Returns None if the build of the package cannot be cached'''
+
+    pkg_conf = confreader.read_conf_into_dict(osp.join(input_root_dir, 'package.conf'))
+    pkg_archive = osp.join(input_root_dir, pkg_conf.get('package-archive', ''))
+
+    if not osp.isfile(pkg_archive):
+        return None
+
+    try:
+        key_parts = get_pkg_class(pkg_conf).get_build_cache_id(pkg_conf, input_root_dir)
+    except NotImplementedError:
+        return None
+
+    if key_parts is None:
+        return None
+
+    # build_summary.xml has absolute paths, so build_root_dir is part of the key
+    return dircache.make_key(dircache.file_digest(pkg_archive),
+                             utillib.platform(),
+                             utillib.get_framework_version(),
+                             build_root_dir,
+                             *key_parts)
+
+
+def _restore_build(entry, output_root_dir, build_root_dir):
+
+    with LogTaskStatus('build', msg_inline='cached'):
+        logging.info('BUILD CACHE HIT %s', entry.path)
+
+        dircache.copy_tree(osp.join(entry.path, BUILD_CACHE_DIR),
+                           build_root_dir,
+                           entry.link_mode)
+
+        shutil.copy2(osp.join(entry.path, 'build.conf'), output_root_dir)
+        build_conf = confreader.read_conf_into_dict(osp.join(output_root_dir, 'build.conf'))
+
+        entry.touch()
+
+    return (int(build_conf['exit-code']), build_conf['build-summary-file'])
+
+
+def _store_build(entry, output_root_dir, build_root_dir):
+
+    def populate(entry_dir):
+        dircache.copy_tree(build_root_dir,
+                           osp.join(entry_dir, BUILD_CACHE_DIR),
+                           'reflink' if entry.link_mode == 'reflink' else 'copy')
+
+        shutil.copy2(osp.join(output_root_dir, 'build.conf'), entry_dir)
+        return 0
+
+    entry.create(populate)
+
+
+def build(input_root_dir, output_root_dir, build_root_dir, build_archive=True):
+    '''If SWAMP_CACHE_DIR is set, a successful build is kept in the 'build' cache
+    and later builds of the same package archive and package.conf are restored from it.
+    With build_archive=False, call archive() to create the build archive'''
+
+    if not osp.isdir(build_root_dir):
+        os.makedirs(build_root_dir, exist_ok=True)
+
+    build_cache = dircache.get_cache('build')
+    cache_key = _get_build_cache_key(input_root_dir, build_root_dir) if build_cache else None
+
+    if cache_key is None:
+        build_result = _build(input_root_dir, output_root_dir, build_root_dir)
+    else:
+        # Holding the entry lock, a package being built by another job is built only once
+        with build_cache.entry(cache_key) as entry:
+            if entry.exists():
+                build_result = _restore_build(entry, output_root_dir, build_root_dir)
+            else:
+                build_result = _build(input_root_dir,
+                                      output_root_dir,
+                                      build_root_dir)
+                if build_result[0] == 0:
+                    _store_build(entry, output_root_dir, build_root_dir)
+
+    if build_archive:
+        archive(output_root_dir, build_root_dir)
+
+    return build_result
+
+
+def archive(output_root_dir, build_root_dir):
+    '''Creates the build archive in output_root_dir and adds it to build.conf'''
+
+    with LogTaskStatus('build-archive'):
+        build_conf_file = osp.join(output_root_dir, 'build.conf')
+        build_conf = confreader.read_conf_into_dict(build_conf_file)
+
+        build_archive = shutil.make_archive(osp.join(output_root_dir, 'build'),
+                                            'gztar',
+                                            osp.dirname(build_root_dir),
+                                            osp.basename(build_root_dir))
+
+        build_conf['build-archive'] = osp.basename(build_archive)
+        build_conf['build-dir'] = osp.basename(build_root_dir)
+
+        utillib.write_to_file(build_conf_file, build_conf)
+
+
+def _build(input_root_dir, output_root_dir, build_root_dir):
+
+    pkg_obj = None
 
     try:
         if not osp.isdir(build_root_dir):
@@ -79,16 +195,53 @@ def build(input_root_dir, output_root_dir, build_root_dir):
         if build_summary_file:
             build_conf['build-summary-file'] = osp.basename(build_summary_file)
 
-        with LogTaskStatus('build-archive'):
-            build_archive = shutil.make_archive(osp.join(output_root_dir, 'build'),
-                                                'gztar',
-                                                osp.dirname(build_root_dir),
-                                                osp.basename(build_root_dir))
-
-            build_conf['build-archive'] = osp.basename(build_archive)
-            build_conf['build-dir'] = osp.basename(build_root_dir)
+        if pkg_obj:
             build_conf.update(pkg_obj.get_build_conf_extras())
 
-            utillib.write_to_file(osp.join(output_root_dir, 'build.conf'), build_conf)
+        utillib.write_to_file(osp.join(output_root_dir, 'build.conf'), build_conf)
 
     return (exit_code, build_summary_file)
+
+
+def restore(input_root_dir, build_root_dir):
+    '''Restores the build of an earlier 'build' run, from build.conf and
+    the build archive in input_root_dir, into build_root_dir'''
+
+    build_conf_file = osp.join(input_root_dir, 'build.conf')
+
+    if not osp.isfile(build_conf_file):
+        raise FileNotFoundException(build_conf_file)
+
+    build_conf = confreader.read_conf_into_dict(build_conf_file)
+    logging.info('BUILD CONF: %s', build_conf)
+
+    if int(build_conf['exit-code']) != 0:
+        return (int(build_conf['exit-code']), None)
+
+    build_archive = osp.join(input_root_dir, build_conf['build-archive'])
+
+    with LogTaskStatus('build-unarchive'):
+        unarchive_dir = osp.join(osp.dirname(build_root_dir),
+                                 'build-unarchive-{0}'.format(utillib.get_uuid()))
+
+        try:
+            if utillib.unpack_archive(build_archive, unarchive_dir) != 0:
+                raise UnpackArchiveError(osp.basename(build_archive))
+
+            archive_build_dir = osp.join(unarchive_dir, build_conf['build-dir'])
+
+            if not osp.isdir(archive_build_dir):
+                raise NotADirectoryException(build_conf['build-dir'])
+
+            if not osp.isdir(build_root_dir):
+                os.makedirs(build_root_dir, exist_ok=True)
+
+            for _file in os.listdir(archive_build_dir):
+                shutil.move(osp.join(archive_build_dir, _file), build_root_dir)
+        finally:
+            shutil.rmtree(unarchive_dir, ignore_errors=True)
+
+        build_summary_file = build_conf['build-summary-file']
+        BuildSummary.relocate(osp.join(build_root_dir, build_summary_file), build_root_dir)
+
+    return (0, build_summary_file)
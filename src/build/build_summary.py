@@ -1,8 +1,11 @@
+import os
 import os.path as osp
 import xml.etree.ElementTree as ET
 import logging
 
 from .common import LANG_EXT_MAPPING
+from .file_inventory import FileInventory
+from . import summary_index
 from .. import utillib
 
 
@@ -11,6 +14,9 @@ class BuildSummary:
     FILENAME = 'build_summary.xml'
     PKG_SRC_TAG = 'pkg-src'
 
+    # Written like the other elements, but kept for the environment diffs
+    KEEP_TAGS = ['base-environment']
+
     @classmethod
     def _add(cls, parent, tag, text=None):
         elem = ET.SubElement(parent, tag)
@@ -37,6 +43,52 @@ class BuildSummary:
         BuildSummary._add(self._root, 'build-fw', 'script-assess')
         BuildSummary._add(self._root, 'build-fw-version', utillib.get_framework_version())
 
+        # Elements are written to the file as they are added to the root,
+        # and to the index (build_summary.db) if it is written
+        self._build_summary_file = osp.join(build_root_dir, BuildSummary.FILENAME)
+        self._writer = utillib.XmlStreamWriter(self._build_summary_file, 'build-summary')
+        self._index = summary_index.get_writer(self._build_summary_file,
+                                               BuildSummary.PKG_SRC_TAG)
+        self._write_root()
+
+    @classmethod
+    def relocate_paths(cls, artifacts_elem, old_root_dir, build_root_dir):
+        '''Moves the absolute paths under old_root_dir in artifacts_elem,
+        of dotnet-compile for instance, to build_root_dir'''
+
+        old_root_dir = osp.normpath(old_root_dir)
+
+        for elem in artifacts_elem.iter():
+            if elem.text and osp.isabs(elem.text) and \
+               (elem.text == old_root_dir or elem.text.startswith(old_root_dir + os.sep)):
+                elem.text = osp.join(build_root_dir, osp.relpath(elem.text, old_root_dir))
+
+    @classmethod
+    def relocate(cls, build_summary_file, build_root_dir):
+        '''Updates build-root-dir and the paths of the build artifacts
+        under it, for a build restored in another directory'''
+
+        tree = ET.parse(build_summary_file)
+        elem = tree.getroot().find('build-root-dir')
+
+        if elem is not None and elem.text != build_root_dir:
+            logging.info('BUILD ROOT DIR: %s -> %s', elem.text, build_root_dir)
+            old_root_dir = elem.text
+            elem.text = build_root_dir
+
+            for artifacts_elem in tree.getroot().iter('build-artifacts'):
+                BuildSummary.relocate_paths(artifacts_elem, old_root_dir, build_root_dir)
+
+            # A stale index stays stale, it is not read
+            index_current = summary_index.is_current(build_summary_file)
+            tree.write(build_summary_file, encoding='UTF-8', xml_declaration=True)
+
+            if index_current:
+                summary_index.relocate(build_summary_file, build_root_dir,
+                                       lambda artifacts_elem: BuildSummary.relocate_paths(artifacts_elem,
+                                                                                          old_root_dir,
+                                                                                          build_root_dir))
+
     def __enter__(self):
         return self
 
@@ -44,25 +96,45 @@ class BuildSummary:
         if value:
             logging.exception(value)
 
-        tree = ET.ElementTree(self._root)
-        build_summary_file = osp.join(self._build_root_dir, BuildSummary.FILENAME)
-        tree.write(build_summary_file, encoding='UTF-8', xml_declaration=True)
+        self._write_root()
+        self._writer.close()
+
+        if self._index:
+            self._index.close(self._build_summary_file)
+
+    def _write_root(self):
+        self._writer.write_children(self._root, BuildSummary.KEEP_TAGS,
+                                    self._index.add if self._index else None)
 
     def add_to_root(self, elem):
         self._root.append(elem)
+        self._write_root()
+
+    @classmethod
+    def _add_output(cls, parent, tag, filename, outputs):
+        '''outputs is CmdResult.outputs, adds the size the command wrote'''
+
+        if not outputs or filename not in outputs:
+            return BuildSummary._add(parent, tag, filename)
+
+        captured = outputs[filename]
+        output_xml = BuildSummary._add(parent, tag, captured.file)
+        output_xml.set('size', str(captured.size))
+        if captured.truncated:
+            output_xml.set('truncated', utillib.bool_to_string(captured.truncated))
+
+        return output_xml
 
     def add_command(self, cmd_type, executable, args,
                     exit_code, environ, working_dir,
-                    stdout_file, stderr_file):
+                    stdout_file, stderr_file, usage=None, timed_out=False,
+                    outputs=None):
 
         cmd_root_xml = BuildSummary._add(self._root, 'build-command')
         cmd_root_xml.set('type', cmd_type)
 
         BuildSummary._add(cmd_root_xml, 'cwd', working_dir)
-        environ_xml = BuildSummary._add(cmd_root_xml, 'environment')
-        for _env in environ.keys():
-            BuildSummary._add(environ_xml, 'env',
-                              '{0}={1}'.format(_env, environ[_env]))
+        utillib.add_environment(self._root, cmd_root_xml, environ)
 
         BuildSummary._add(cmd_root_xml, 'executable', executable)
         args_xml = BuildSummary._add(cmd_root_xml, 'args')
@@ -71,8 +143,17 @@ class BuildSummary:
                 BuildSummary._add(args_xml, 'arg', _arg)
 
         BuildSummary._add(cmd_root_xml, 'exit-code', str(exit_code))
-        BuildSummary._add(cmd_root_xml, 'stdout-file', stdout_file)
-        BuildSummary._add(cmd_root_xml, 'stderr-file', stderr_file)
+        if timed_out:
+            BuildSummary._add(cmd_root_xml, 'timed-out', utillib.bool_to_string(timed_out))
+        BuildSummary._add_output(cmd_root_xml, 'stdout-file', stdout_file, outputs)
+        BuildSummary._add_output(cmd_root_xml, 'stderr-file', stderr_file, outputs)
+
+        if usage is not None:
+            usage_xml = BuildSummary._add(cmd_root_xml, 'resource-usage')
+            for tag, text in utillib.resource_usage_items(usage):
+                BuildSummary._add(usage_xml, tag, text)
+
+        self._write_root()
 
     def add_exit_code(self, exit_code):
         if exit_code >= 0:
@@ -80,6 +161,8 @@ class BuildSummary:
         elif exit_code < 0:
             BuildSummary._add(self._root, 'exit-signal', str(abs(exit_code)))
 
+        self._write_root()
+
     def _add_file_set(self, parent_xml, xml_tag, fileset):
         xml_elem = BuildSummary._add(parent_xml, xml_tag)
         for _file in fileset:
@@ -87,17 +170,21 @@ class BuildSummary:
                               osp.relpath(_file, self._build_root_dir))
 
     def add_build_artifacts(self, fileset, pkg_lang):
+        '''Adds the files in fileset (see FileInventory.from_files) by language,
+        and writes their FileInventory next to the build summary'''
 
         build_artifacts_xml = BuildSummary._add(self._root, 'build-artifacts')
         pkg_xml = BuildSummary._add(build_artifacts_xml, BuildSummary.PKG_SRC_TAG)
 
-        if isinstance(pkg_lang, str):
-            pkg_lang = pkg_lang.lower().split()
+        inventory = FileInventory.from_files(fileset, pkg_lang)
+        inventory.write(osp.join(self._build_root_dir, FileInventory.FILENAME),
+                        self._build_root_dir)
+        BuildSummary._add(self._root, 'file-inventory', FileInventory.FILENAME)
+
+        lang_files = inventory.get_lang_files(pkg_lang)
 
-        for lang, ext in LANG_EXT_MAPPING.items():
-            if lang in pkg_lang:
-                files = [_file for _file in fileset
-                         if osp.splitext(_file)[1] in ext]
+        for lang in LANG_EXT_MAPPING.keys():
+            if lang_files.get(lang):
+                self._add_file_set(pkg_xml, '{0}-src'.format(lang), lang_files[lang])
 
-                if files:
-                    self._add_file_set(pkg_xml, '{0}-src'.format(lang), files)
+        self._write_root()
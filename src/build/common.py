@@ -26,18 +26,24 @@ class EmptyPackageError(Exception):
 
 class CommandFailedError(Exception):
 
-    def __init__(self, command, exit_code, summary_file, outfile, errfile):
+    def __init__(self, command, exit_code, summary_file, outfile, errfile, timed_out=False):
         Exception.__init__(self)
         self.command = ' '.join(command) if isinstance(command, list) else command
         self.exit_code = exit_code
+        self.timed_out = timed_out
+        # Shown in status.out next to the task name
+        self.msg_inline = 'timeout' if timed_out else None
         self.summary_file = summary_file
         self.outfile = outfile
         self.errfile = errfile
 
     def __str__(self):
 
-        disp_str = "Command '{0}' failed with exit-code '{1}'".format(self.command,
-                                                                      self.exit_code)
+        if self.timed_out:
+            disp_str = "Command '{0}' timed out".format(self.command)
+        else:
+            disp_str = "Command '{0}' failed with exit-code '{1}'".format(self.command,
+                                                                          self.exit_code)
 
         if self.outfile and self.errfile:
             disp_str += ", See "
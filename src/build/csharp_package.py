@@ -11,7 +11,6 @@ from .. import fileutil
 
 from .. import utillib
 
-import pdb
 import json
 from collections import namedtuple
 
@@ -174,17 +173,26 @@ class CsharpPkg(Package):
                 outfile = osp.join(build_root_dir, 'build-{0}.out'.format(build_info.build_id))
                 errfile = osp.join(build_root_dir, 'build-{0}.err'.format(build_info.build_id))
 
-                exit_code, environ = utillib.run_cmd(build_info.build_cmd,
-                                                     cwd=build_info.build_dir,
-                                                     outfile=outfile,
-                                                     errfile=errfile,
-                                                     env=self._get_env(build_info.build_dir),
-                                                     description='BUILD')
+                cmd_result = utillib.run_cmd(build_info.build_cmd,
+                                             cwd=build_info.build_dir,
+                                             outfile=outfile,
+                                             errfile=errfile,
+                                             env=self._get_env(build_info.build_dir),
+                                             description='BUILD',
+                                             timeout=self.pkg_conf.get('build-timeout'))
+                exit_code, environ = cmd_result
 
                 build_summary.add_command('build', build_info.build_cmd[0],
                                           build_info.build_cmd, exit_code, environ,
                                           environ['PWD'],
-                                          outfile, errfile)
+                                          outfile, errfile,
+                                          usage=cmd_result.usage,
+                                          timed_out=cmd_result.timed_out,
+                                          outputs=cmd_result.outputs)
+
+                # The files written, with '.gz' if they are compressed
+                outfile = utillib.get_output_file(cmd_result.outputs, outfile)
+                errfile = utillib.get_output_file(cmd_result.outputs, errfile)
 
                 build_summary.add_exit_code(exit_code)
 
@@ -193,7 +201,8 @@ class CsharpPkg(Package):
                                                     exit_code,
                                                     BuildSummary.FILENAME,
                                                     osp.relpath(outfile, build_root_dir),
-                                                    osp.relpath(errfile, build_root_dir))
+                                                    osp.relpath(errfile, build_root_dir),
+                                                    timed_out=cmd_result.timed_out)
 
             self.add_build_artifacts(build_summary, build_root_dir, pkg_build_dir)
                 
@@ -0,0 +1,123 @@
+'''
+Inventory of the source files of the package, made once in the build
+and written next to build_summary.xml, the assessment reads it instead
+of looking at the package directory again
+'''
+
+import os
+import os.path as osp
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from .common import LANG_EXT_MAPPING
+from .. import utillib
+
+
+FileInfo = namedtuple('FileInfo', ['path', 'size', 'mtime', 'ext', 'lang'])
+
+
+def get_ext_langs(pkg_lang):
+    '''Maps the extensions of the languages in pkg_lang to the languages,
+    in the order of LANG_EXT_MAPPING'''
+
+    if isinstance(pkg_lang, str):
+        pkg_lang = pkg_lang.lower().split()
+
+    ext_langs = dict()
+    for lang, exts in LANG_EXT_MAPPING.items():
+        if lang in pkg_lang:
+            for ext in exts:
+                ext_langs.setdefault(ext, []).append(lang)
+
+    return ext_langs
+
+
+def _stat(path, entry):
+    '''entry is the os.DirEntry of path or None, DirEntry caches its stat'''
+    try:
+        return entry.stat() if entry else os.stat(path)
+    except OSError:
+        # A broken symbolic link
+        return entry.stat(follow_symlinks=False) if entry else os.lstat(path)
+
+
+class FileInventory:
+
+    FILENAME = 'file_inventory.xml'
+
+    def __init__(self, files):
+        '''files is a list of FileInfo'''
+        self.files = files
+
+    @classmethod
+    def from_files(cls, fileset, pkg_lang):
+        '''fileset is a dictionary of path to the os.DirEntry of the walk or None.
+        Looks at every file in fileset once, files with none of the
+        extensions of pkg_lang are left out'''
+
+        ext_langs = get_ext_langs(pkg_lang)
+        files = list()
+
+        for _file in sorted(fileset):
+            ext = osp.splitext(_file)[1]
+
+            if ext in ext_langs:
+                stat = _stat(_file, fileset[_file])
+                files.append(FileInfo(_file, stat.st_size, stat.st_mtime,
+                                      ext, ext_langs[ext][0]))
+
+        return cls(files)
+
+    @classmethod
+    def read(cls, inventory_file, build_root_dir):
+        '''Paths in inventory_file are relative to build_root_dir'''
+
+        files = list()
+
+        for elem in ET.parse(inventory_file).getroot():
+            files.append(FileInfo(osp.join(build_root_dir, elem.text),
+                                  int(elem.get('size')),
+                                  float(elem.get('mtime')),
+                                  elem.get('ext'),
+                                  elem.get('lang')))
+
+        return cls(files)
+
+    def write(self, inventory_file, build_root_dir):
+
+        writer = utillib.XmlStreamWriter(inventory_file, 'file-inventory')
+
+        try:
+            for info in self.files:
+                elem = ET.Element('file')
+                elem.text = osp.relpath(info.path, build_root_dir)
+                elem.set('size', str(info.size))
+                elem.set('mtime', repr(info.mtime))
+                elem.set('ext', info.ext)
+                elem.set('lang', info.lang)
+                writer.write(elem)
+        finally:
+            writer.close()
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def get_lang_files(self, pkg_lang):
+        '''Returns a dictionary of language (in pkg_lang) to the list of its files,
+        a file with an extension of more than one language is in each list'''
+
+        ext_langs = get_ext_langs(pkg_lang)
+        lang_files = dict()
+
+        for info in self.files:
+            for lang in ext_langs.get(info.ext, []):
+                lang_files.setdefault(lang, []).append(info.path)
+
+        return lang_files
+
+    def get_file_sizes(self):
+        '''Returns a dictionary of path to size'''
+        return {info.path: info.size for info in self.files}
@@ -2,7 +2,6 @@ import os
 import os.path as osp
 from abc import ABCMeta
 import logging
-import pdb
 
 from . import common
 from .build_summary import BuildSummary
@@ -42,6 +41,12 @@ class Package(metaclass=ABCMeta):
         self.pkg_dir = osp.normpath(pkg_dir)
         self._build_conf_extras = dict()
 
+    @classmethod
+    def get_build_cache_id(cls, pkg_conf, input_root_dir):
+        '''Returns the list of strings, other than the package archive, that decide
+        the result of the build. None if the build cannot be cached'''
+        return ['{0}={1}'.format(key, pkg_conf[key]) for key in sorted(pkg_conf)]
+
     def _get_env(self, pwd):
         new_env = dict(os.environ)
         if 'PWD' in new_env:
@@ -82,15 +87,15 @@ class Package(metaclass=ABCMeta):
 
                 outfile = osp.join(build_root_dir, config_stdout)
                 errfile = osp.join(build_root_dir, config_stderr)
-                self.add_build_conf_attr('config-stdout-file', config_stdout)
-                self.add_build_conf_attr('config-stderr-file', config_stderr)
 
-                exit_code, environ = utillib.run_cmd(config_cmd,
-                                                     outfile,
-                                                     errfile,
-                                                     cwd=config_dir,
-                                                     env=self._get_env(config_dir),
-                                                     description="CONFIGURE")
+                cmd_result = utillib.run_cmd(config_cmd,
+                                             outfile,
+                                             errfile,
+                                             cwd=config_dir,
+                                             env=self._get_env(config_dir),
+                                             description="CONFIGURE",
+                                             timeout=self.pkg_conf.get('config-timeout'))
+                exit_code, environ = cmd_result
 
                 if isinstance(config_cmd, str):
                     config_cmd_arr = ['/bin/sh', '-c', config_cmd]
@@ -104,7 +109,16 @@ class Package(metaclass=ABCMeta):
                                           environ,
                                           config_dir,
                                           outfile,
-                                          errfile)
+                                          errfile,
+                                          usage=cmd_result.usage,
+                                          timed_out=cmd_result.timed_out,
+                                          outputs=cmd_result.outputs)
+
+                # The files written, with '.gz' if they are compressed
+                outfile = utillib.get_output_file(cmd_result.outputs, outfile)
+                errfile = utillib.get_output_file(cmd_result.outputs, errfile)
+                self.add_build_conf_attr('config-stdout-file', osp.basename(outfile))
+                self.add_build_conf_attr('config-stderr-file', osp.basename(errfile))
 
                 if exit_code != 0:
                     build_summary.add_exit_code(exit_code)
@@ -112,7 +126,8 @@ class Package(metaclass=ABCMeta):
                                                     exit_code,
                                                     BuildSummary.FILENAME,
                                                     osp.relpath(outfile, build_root_dir),
-                                                    osp.relpath(errfile, build_root_dir))
+                                                    osp.relpath(errfile, build_root_dir),
+                                                    timed_out=cmd_result.timed_out)
 
     def get_build_cmd(self, build_root_dir):
         raise NotImplementedError('Cannot use this class directly')
@@ -140,16 +155,16 @@ class Package(metaclass=ABCMeta):
 
             outfile = osp.join(build_root_dir, build_stdout)
             errfile = osp.join(build_root_dir, build_stderr)
-            self.add_build_conf_attr('build-stdout-file', build_stdout)
-            self.add_build_conf_attr('build-stderr-file', build_stderr)
 
 
-            exit_code, environ = utillib.run_cmd(build_cmd,
-                                                 cwd=pkg_build_dir,
-                                                 outfile=outfile,
-                                                 errfile=errfile,
-                                                 env=self._get_env(pkg_build_dir),
-                                                 description='BUILD')
+            cmd_result = utillib.run_cmd(build_cmd,
+                                         cwd=pkg_build_dir,
+                                         outfile=outfile,
+                                         errfile=errfile,
+                                         env=self._get_env(pkg_build_dir),
+                                         description='BUILD',
+                                         timeout=self.pkg_conf.get('build-timeout'))
+            exit_code, environ = cmd_result
 
             if isinstance(build_cmd, str):
                 build_cmd_arr = ['/bin/sh', '-c', build_cmd]
@@ -159,7 +174,16 @@ class Package(metaclass=ABCMeta):
             build_summary.add_command('build', build_cmd_arr[0],
                                       build_cmd_arr, exit_code, environ,
                                       environ['PWD'],
-                                      outfile, errfile)
+                                      outfile, errfile,
+                                      usage=cmd_result.usage,
+                                      timed_out=cmd_result.timed_out,
+                                      outputs=cmd_result.outputs)
+
+            # The files written, with '.gz' if they are compressed
+            outfile = utillib.get_output_file(cmd_result.outputs, outfile)
+            errfile = utillib.get_output_file(cmd_result.outputs, errfile)
+            self.add_build_conf_attr('build-stdout-file', osp.basename(outfile))
+            self.add_build_conf_attr('build-stderr-file', osp.basename(errfile))
 
             build_summary.add_exit_code(exit_code)
 
@@ -167,13 +191,14 @@ class Package(metaclass=ABCMeta):
                 raise common.CommandFailedError(build_cmd, exit_code,
                                                 BuildSummary.FILENAME,
                                                 osp.relpath(outfile, build_root_dir),
-                                                osp.relpath(errfile, build_root_dir))
+                                                osp.relpath(errfile, build_root_dir),
+                                                timed_out=cmd_result.timed_out)
 
             self.add_build_artifacts(build_summary, build_root_dir, pkg_build_dir)
             return (exit_code, BuildSummary.FILENAME)
 
     def add_build_artifacts(self, build_summary, build_root_dir, pkg_build_dir):
-        fileset = set()
+        fileset = dict()
         for dir_path in self.get_main_dir(pkg_build_dir):
             fileset.update(self.get_src_files(dir_path,
                                               self.pkg_conf.get('package-exclude-paths',
@@ -182,17 +207,13 @@ class Package(metaclass=ABCMeta):
         build_summary.add_build_artifacts(fileset, self.pkg_conf['package-language'])
 
     def get_src_files(self, pkg_dir, exclude_filter):
+        '''Returns a dictionary of path to the os.DirEntry of the file
+        from the walk, or None if the file was not walked'''
 
-        fileset = set()
-        fileset.update(fileutil.get_file_list(pkg_dir, None,
-                                              common.get_file_extentions(self.pkg_conf['package-language'])))
-
-        file_filters = fileutil.get_file_filters(pkg_dir, exclude_filter.split(','))
-        fileset = fileset.difference(file_filters.exclude_files)
-        fileset = fileset.difference(_file for _file in fileset
-                                     for exdir in file_filters.exclude_dirs
-                                     if _file.startswith(osp.join(exdir, '')))
-        return fileset
+        # Excluded directories are not walked
+        entries = fileutil.get_file_entries(pkg_dir, fileutil.get_exclude_patterns(exclude_filter),
+                                            common.get_file_extentions(self.pkg_conf['package-language']))
+        return {entry.path: entry for entry in entries}
 
     def build(self, build_root_dir):
 
@@ -27,14 +27,36 @@ class PythonPkg(Package, metaclass=ABCMeta):
         new_env['PATH'] = '%s/bin:%s' % (self.python_home, new_env['PATH'])
         return new_env
 
-    def _get_tool_lang(self, input_root_dir):
+    @classmethod
+    def get_build_cache_id(cls, pkg_conf, input_root_dir):
+        # pip-install puts packages in the user site directory, outside build_root_dir
+        if 'package-pip-install-file' in pkg_conf:
+            return None
+
+        return super().get_build_cache_id(pkg_conf, input_root_dir) + \
+            ['python-flavor={0}'.format(cls._get_tool_lang(input_root_dir))]
+
+    @staticmethod
+    def _get_tool_lang(input_root_dir):
 
         run_conf = confreader.read_conf_into_dict(osp.join(input_root_dir, 'run.conf'))
         if 'assess' not in run_conf['goal']:
             return 3
-        else:
-            tool_conf = confreader.read_conf_into_dict(osp.join(input_root_dir, 'tool.conf'))
-            return int(tool_conf['python-flavor']) if 'python-flavor' in tool_conf else 3
+
+        # tool.conf, or the files in 'tool-conf-files' (see assess.get_tool_conf_files),
+        # the first that has python-flavor
+        tool_conf_files = run_conf.get('tool-conf-files', '').replace(',', ' ').split() \
+                          or ['tool.conf']
+
+        for tool_conf_file in tool_conf_files:
+            tool_conf_file = osp.join(input_root_dir, tool_conf_file)
+
+            if osp.isfile(tool_conf_file):
+                tool_conf = confreader.read_conf_into_dict(tool_conf_file)
+                if 'python-flavor' in tool_conf:
+                    return int(tool_conf['python-flavor'])
+
+        return 3
 
     def _create_venv_old(self, input_root_dir, build_root_dir):
         pkg_lang = self.pkg_conf['package-language'].lower()
@@ -110,26 +132,36 @@ class PythonPkg(Package, metaclass=ABCMeta):
                 outfile = osp.join(build_root_dir, 'pip_install.out')
                 errfile = osp.join(build_root_dir, 'pip_install.err')
 
-                exit_code, environ = utillib.run_cmd(pip_cmd,
-                                                     cwd=self.pkg_dir,
-                                                     outfile=outfile,
-                                                     errfile=errfile,
-                                                     env=self._get_env(self.pkg_dir),
-                                                     description='PIP INSTALL')
+                cmd_result = utillib.run_cmd(pip_cmd,
+                                             cwd=self.pkg_dir,
+                                             outfile=outfile,
+                                             errfile=errfile,
+                                             env=self._get_env(self.pkg_dir),
+                                             description='PIP INSTALL',
+                                             timeout=self.pkg_conf.get('build-timeout'))
+                exit_code, environ = cmd_result
 
                 pip_cmd_arr = ['/bin/sh', '-c', pip_cmd]
 
                 build_summary.add_command('pip-install', pip_cmd_arr[0],
                                           pip_cmd_arr, exit_code, environ,
                                           environ['PWD'],
-                                          outfile, errfile)
+                                          outfile, errfile,
+                                          usage=cmd_result.usage,
+                                          timed_out=cmd_result.timed_out,
+                                          outputs=cmd_result.outputs)
+
+                # The files written, with '.gz' if they are compressed
+                outfile = utillib.get_output_file(cmd_result.outputs, outfile)
+                errfile = utillib.get_output_file(cmd_result.outputs, errfile)
 
                 if exit_code != 0:
                     build_summary.add_exit_code(exit_code)
                     raise common.CommandFailedError(pip_cmd, exit_code,
                                                     BuildSummary.FILENAME,
                                                     osp.relpath(outfile, build_root_dir),
-                                                    osp.relpath(errfile, build_root_dir))
+                                                    osp.relpath(errfile, build_root_dir),
+                                                    timed_out=cmd_result.timed_out)
 
     def build(self, build_root_dir):
 
@@ -158,6 +190,11 @@ class PythonDistUtilsPkg(PythonPkg):
 
 class PythonWheelPkg(PythonPkg):
 
+    @classmethod
+    def get_build_cache_id(cls, pkg_conf, input_root_dir):
+        # The wheel is installed in the user site directory, outside build_root_dir
+        return None
+
     def __init__(self, pkg_conf_file, input_root_dir, build_root_dir):
         ''' Do not call Package.__init__'''
 
@@ -0,0 +1,288 @@
+'''
+SQLite index of build_summary.xml, written next to it by BuildSummary
+(build_summary.db), so that the assessment of packages with many files
+does not parse the XML. It has the values of the build summary, the
+package conf, the files of every language in build-artifacts, and the
+build commands without their environment.
+
+The index is used only if it was written for the build summary as it is,
+otherwise the XML is read. The size and the modification time of the XML
+are checked (xml-size, xml-mtime-ns), and if only the time differs, as
+after the build archive is unpacked, its sha256 (xml-digest).
+Set SWAMP_SUMMARY_INDEX to false to not write it. Nothing is written or
+read if the python has no sqlite3.
+'''
+
+import os
+import os.path as osp
+import json
+import logging
+import xml.etree.ElementTree as ET
+from contextlib import closing
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from .. import utillib
+from .. import dircache
+
+
+SUMMARY_INDEX_ENV = 'SWAMP_SUMMARY_INDEX'
+
+FORMAT_VERSION = '3'
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE summary (key TEXT, value TEXT);
+CREATE TABLE package_conf (key TEXT, value TEXT);
+CREATE TABLE artifacts (position INTEGER, tag TEXT, xml TEXT);
+CREATE TABLE files (position INTEGER, tag TEXT, path TEXT);
+CREATE INDEX files_position_tag ON files (position, tag);
+CREATE TABLE commands (position INTEGER, type TEXT, executable TEXT, args TEXT,
+                       exit_code TEXT, cwd TEXT, stdout_file TEXT, stderr_file TEXT);
+'''
+
+
+def _get_xml_stamp(build_summary_file):
+    '''The meta values that tie the index to build_summary_file'''
+
+    stat = os.stat(build_summary_file)
+    return [('xml-size', str(stat.st_size)),
+            ('xml-mtime-ns', str(stat.st_mtime_ns)),
+            ('xml-digest', dircache.file_digest(build_summary_file))]
+
+
+def get_index_file(build_summary_file):
+    return osp.splitext(build_summary_file)[0] + '.db'
+
+
+def index_enabled():
+    return sqlite3 is not None and \
+        utillib.string_to_bool(os.getenv(SUMMARY_INDEX_ENV, 'true').lower())
+
+
+def _connect(index_file):
+    '''Read only'''
+    return sqlite3.connect('file:{0}?mode=ro'.format(index_file), uri=True)
+
+
+class SummaryIndexWriter:
+    '''Gets the elements of the build summary root as they are written'''
+
+    def __init__(self, build_summary_file, pkg_src_tag):
+        self._index_file = get_index_file(build_summary_file)
+        self._tmp_file = '{0}.tmp-{1}'.format(self._index_file, os.getpid())
+        self._pkg_src_tag = pkg_src_tag
+        self._commands = 0
+        self._has_artifacts = False
+
+        if osp.exists(self._tmp_file):
+            os.remove(self._tmp_file)
+
+        self._conn = sqlite3.connect(self._tmp_file)
+        self._conn.executescript(SCHEMA)
+
+    def add(self, elem):
+        '''elem is a complete element of the build summary root'''
+
+        if self._conn is None:
+            return
+
+        try:
+            self._add(elem)
+        except sqlite3.Error as err:
+            logging.info('SUMMARY INDEX NOT WRITTEN: %s', err)
+            self._discard()
+
+    def _discard(self):
+        self._conn.close()
+        self._conn = None
+        os.remove(self._tmp_file)
+
+    def _add(self, elem):
+
+        if elem.tag == 'package-conf':
+            self._conn.executemany('INSERT INTO package_conf VALUES (?, ?)',
+                                   ((child.tag, child.text) for child in elem))
+
+        elif elem.tag == 'build-artifacts':
+            self._has_artifacts = True
+            for position, child in enumerate(elem, 1):
+                if child.tag == self._pkg_src_tag:
+                    self._conn.execute('INSERT INTO artifacts VALUES (?, ?, NULL)',
+                                       (position, child.tag))
+                    for lang_elem in child:
+                        self._conn.executemany('INSERT INTO files VALUES (?, ?, ?)',
+                                               ((position, lang_elem.tag, _file.text)
+                                                for _file in lang_elem))
+                else:
+                    self._conn.execute('INSERT INTO artifacts VALUES (?, ?, ?)',
+                                       (position, child.tag,
+                                        ET.tostring(child, encoding='unicode')))
+
+        elif elem.tag == 'build-command':
+            self._commands += 1
+            self._conn.execute('INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (self._commands,
+                                elem.get('type'),
+                                elem.findtext('executable'),
+                                json.dumps([arg.text for arg in elem.iter('arg')]),
+                                elem.findtext('exit-code'),
+                                elem.findtext('cwd'),
+                                elem.findtext('stdout-file'),
+                                elem.findtext('stderr-file')))
+
+        elif len(elem) == 0:
+            self._conn.execute('INSERT INTO summary VALUES (?, ?)', (elem.tag, elem.text))
+
+    def close(self, build_summary_file):
+        '''Call once build_summary_file is complete'''
+
+        if self._conn is None:
+            return
+
+        self._conn.executemany('INSERT INTO meta VALUES (?, ?)',
+                               [('format-version', FORMAT_VERSION),
+                                ('build-artifacts', utillib.bool_to_string(self._has_artifacts))] +
+                               _get_xml_stamp(build_summary_file))
+        self._conn.commit()
+        self._conn.close()
+        os.replace(self._tmp_file, self._index_file)
+
+
+def get_writer(build_summary_file, pkg_src_tag):
+    '''Returns a SummaryIndexWriter, None if the index is not written'''
+
+    if not index_enabled():
+        return None
+
+    try:
+        return SummaryIndexWriter(build_summary_file, pkg_src_tag)
+    except sqlite3.Error as err:
+        logging.info('SUMMARY INDEX NOT WRITTEN: %s', err)
+        return None
+
+
+def _is_current(meta, build_summary_file):
+    '''The XML is read (xml-digest) only if its size is the same
+    and its modification time is not'''
+
+    if meta.get('format-version') != FORMAT_VERSION:
+        return False
+
+    stat = os.stat(build_summary_file)
+
+    if meta.get('xml-size') != str(stat.st_size):
+        return False
+
+    if meta.get('xml-mtime-ns') == str(stat.st_mtime_ns):
+        return True
+
+    return meta.get('xml-digest') == dircache.file_digest(build_summary_file)
+
+
+def is_current(build_summary_file):
+    '''True if there is an index for build_summary_file as it is'''
+
+    index_file = get_index_file(build_summary_file)
+
+    if sqlite3 is None or not osp.isfile(index_file):
+        return False
+
+    try:
+        with closing(_connect(index_file)) as conn:
+            return _is_current(dict(conn.execute('SELECT key, value FROM meta')),
+                               build_summary_file)
+    except sqlite3.Error:
+        return False
+
+
+def relocate(build_summary_file, build_root_dir, relocate_paths):
+    '''Same as BuildSummary.relocate, call after the XML is updated
+    and only if is_current was True before. relocate_paths updates
+    the paths in an element of the artifacts table'''
+
+    index_file = get_index_file(build_summary_file)
+
+    with closing(sqlite3.connect(index_file)) as conn:
+        conn.execute("UPDATE summary SET value = ? WHERE key = 'build-root-dir'",
+                     (build_root_dir,))
+
+        for rowid, xml in list(conn.execute('SELECT rowid, xml FROM artifacts '
+                                            'WHERE xml IS NOT NULL')):
+            elem = ET.fromstring(xml)
+            relocate_paths(elem)
+            conn.execute('UPDATE artifacts SET xml = ? WHERE rowid = ?',
+                         (ET.tostring(elem, encoding='unicode'), rowid))
+
+        conn.executemany('UPDATE meta SET value = ? WHERE key = ?',
+                         [(value, key) for key, value in _get_xml_stamp(build_summary_file)])
+        conn.commit()
+
+
+class FileLists:
+    '''Read only dictionary of <lang>-src to its files for an artifact
+    in the index, the files are read when they are asked for'''
+
+    def __init__(self, index_file, position):
+        self._index_file = index_file
+        self._position = position
+
+        with closing(_connect(index_file)) as conn:
+            self._tags = [tag for tag, in conn.execute('SELECT DISTINCT tag FROM files '
+                                                       'WHERE position = ? ORDER BY rowid',
+                                                       (position,))]
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __contains__(self, tag):
+        return tag in self._tags
+
+    def __getitem__(self, tag):
+        if tag not in self._tags:
+            raise KeyError(tag)
+
+        # A connection for each read, the helper is shared by threads
+        with closing(_connect(self._index_file)) as conn:
+            return [path for path, in conn.execute('SELECT path FROM files '
+                                                   'WHERE position = ? AND tag = ? ORDER BY rowid',
+                                                   (self._position, tag))]
+
+
+def read(build_summary_file):
+    '''Returns (summary values, package conf, build artifacts) from the index
+    of build_summary_file, build artifacts being a list of (tag, FileLists)
+    for pkg-src and (tag, Element) for the others, None if the build has no
+    artifacts. Returns None if there is no usable index'''
+
+    index_file = get_index_file(build_summary_file)
+
+    if sqlite3 is None or not osp.isfile(index_file):
+        return None
+
+    try:
+        with closing(_connect(index_file)) as conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+
+            if not _is_current(meta, build_summary_file):
+                logging.info('SUMMARY INDEX OUT OF DATE: %s', index_file)
+                return None
+
+            summary = dict(conn.execute('SELECT key, value FROM summary ORDER BY rowid'))
+            package_conf = dict(conn.execute('SELECT key, value FROM package_conf ORDER BY rowid'))
+            artifacts = list(conn.execute('SELECT position, tag, xml FROM artifacts ORDER BY position'))
+    except sqlite3.Error as err:
+        logging.info('SUMMARY INDEX NOT USED: %s', err)
+        return None
+
+    if utillib.string_to_bool(meta.get('build-artifacts')):
+        build_artifacts = [(tag, FileLists(index_file, position) if xml is None
+                            else ET.fromstring(xml))
+                           for position, tag, xml in artifacts]
+    else:
+        build_artifacts = None
+
+    return (summary, package_conf, build_artifacts)
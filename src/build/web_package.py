@@ -23,33 +23,33 @@ class JsNodePkg(Package):
                 ignore_file = osp.join(pkg_dir, '.gitignore')
 
             if ignore_file:
+                # In order, the last pattern that matches decides
                 with open(ignore_file) as fobj:
-                    ignore_patterns = {p.strip().strip('\n') for p in fobj
-                                       if p and not p.isspace() and not p.strip().startswith('#')}
-                    ignore_patterns.add('node_modules')
-                    return ignore_patterns
+                    return [p for p in fobj] + ['node_modules']
 
-        fileset = set()
+        fileset = dict()
 
         with open(osp.join(pkg_dir, 'package.json')) as fobj:
             pkg_json = json.load(fobj)
 
             if 'main' in pkg_json:
                 if osp.isfile(osp.join(pkg_dir, pkg_json['main'])):
-                    fileset.add(osp.join(pkg_dir, pkg_json['main']))
+                    fileset[osp.join(pkg_dir, pkg_json['main'])] = None
 
             if 'files' in pkg_json:
                 for _file in [osp.join(pkg_dir, f)
                               for f in pkg_json['files']]:
                     if osp.isdir(_file):
-                        fileset.update(fileutil.get_file_list(_file, None,
-                                                              common.get_file_extentions(self.pkg_conf['package-language'])))
+                        fileset.update((entry.path, entry)
+                                       for entry in fileutil.get_file_entries(_file, None,
+                                                                              common.get_file_extentions(self.pkg_conf['package-language'])))
                     else:
-                        fileset.add(_file)
+                        fileset.setdefault(_file, None)
             else:
-                fileset.update(fileutil.get_file_list(pkg_dir,
-                                                      npm_ignore_list(),
-                                                      common.get_file_extentions(self.pkg_conf['package-language'])))
+                fileset.update((entry.path, entry)
+                               for entry in fileutil.get_file_entries(pkg_dir,
+                                                                      npm_ignore_list(),
+                                                                      common.get_file_extentions(self.pkg_conf['package-language'])))
 
         return fileset
 
@@ -61,14 +61,9 @@ class JsNodePkg(Package):
 
         fileset = self.get_nodejs_files(pkg_dir)
 
-        file_filters = fileutil.get_file_filters(pkg_dir, exclude_filter.split(','))
-        fileset = fileset.difference(file_filters.exclude_files)
-
-        fileset = fileset.difference(_file for _file in fileset
-                                     for exdir in file_filters.exclude_dirs
-                                     if _file.startswith(osp.join(exdir, '')))
-
-        return fileset
+        return {_file: fileset[_file]
+                for _file in fileutil.filter_file_list(fileset, pkg_dir,
+                                                       fileutil.get_exclude_patterns(exclude_filter))}
 
     def get_build_cmd(self, build_root_dir):
         return 'npm install'
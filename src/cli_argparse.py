@@ -46,32 +46,71 @@ def process_cmd_line_args():
 
     parser.add_argument('--inputDir',
                         dest='input_dir',
-                        required=True,
+                        required=False,
                         type=str,
                         help='Path to the Input Directory')
 
     parser.add_argument('--outDir',
                         dest='output_dir',
-                        required=True,
+                        required=False,
                         type=str,
                         help='Path to the Output Directory')
 
     parser.add_argument('--buildDir',
                         dest='build_dir',
-                        required=True,
+                        required=False,
                         type=str,
                         help='Path to the Build Directory where the package is unarchived and built')
 
     parser.add_argument('--toolDir',
                         dest='tool_dir',
-                        required=True,
+                        required=False,
                         type=str,
                         help='Path to the Tool Directory')
 
     parser.add_argument('--resultsDir',
                         dest='results_dir',
-                        required=True,
+                        required=False,
                         type=str,
                         help='Path to the directory where Assessment results are placed')
 
-    return parser.parse_args()
+    parser.add_argument('--batchManifest',
+                        dest='batch_manifest',
+                        required=False,
+                        type=str,
+                        help='Run the jobs listed in this file instead of a single job, '
+                        'each line is a job directory or the input, output, build, tool and results directories')
+
+    parser.add_argument('--batchJobs',
+                        dest='batch_jobs',
+                        required=False,
+                        type=str,
+                        default='auto',
+                        help="Maximum number of batch or daemon jobs that run at the same time, "
+                        "a number or 'auto' (number of CPUs)")
+
+    parser.add_argument('--daemonSocket',
+                        dest='daemon_socket',
+                        required=False,
+                        type=str,
+                        help='Run as a daemon that accepts jobs on this Unix domain socket')
+
+    parser.add_argument('--batchSummary',
+                        dest='batch_summary',
+                        required=False,
+                        type=str,
+                        default='batch_summary.conf',
+                        help='File where the exit code and time of every batch job is written')
+
+    clargs = parser.parse_args()
+
+    if not clargs.batch_manifest and not clargs.daemon_socket:
+        for option, value in [('--inputDir', clargs.input_dir),
+                              ('--outDir', clargs.output_dir),
+                              ('--buildDir', clargs.build_dir),
+                              ('--toolDir', clargs.tool_dir),
+                              ('--resultsDir', clargs.results_dir)]:
+            if value is None:
+                parser.error('the following arguments are required: ' + option)
+
+    return clargs
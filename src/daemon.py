@@ -0,0 +1,280 @@
+'''
+Daemon mode, accepts jobs on a Unix domain socket and runs each job in a
+process forked from the daemon. The framework modules, the gencmd lexer and
+parser are loaded once, in the daemon (batch.preload).
+
+A client connects and sends a request, a JSON object on one line:
+  {"jobDir": "/abs/path"}
+or
+  {"inputDir": ..., "outDir": ..., "buildDir": ..., "toolDir": ..., "resultsDir": ...}
+The directories are the same as in batch mode and must be absolute paths.
+
+The daemon replies with JSON lines on the same connection:
+  {"pid": <worker pid>} when the job starts, and
+  {"exit-code": <exit code>} when it ends, then closes the connection.
+An invalid request gets {"error": <message>}.
+
+At most max_jobs jobs run at the same time, with the admission control of
+batch mode, other requests wait in a queue. The tool invoke files of a job
+are parsed in the daemon before it is forked (batch.preload_job), the
+following jobs get the templates. SIGTERM or SIGINT stops the daemon after
+the running jobs are done.
+'''
+
+import os
+import os.path as osp
+import json
+import stat
+import signal
+import socket
+import logging
+import selectors
+import multiprocessing
+from collections import deque
+
+from . import batch
+from . import utillib
+
+REQUEST_DIRS = ['inputDir', 'outDir', 'buildDir', 'toolDir', 'resultsDir']
+
+
+def _run_forked_job(job, run_job, inherited):
+    '''Runs in the forked process, inherited are the daemon's sockets,
+    selector and files, that the job must not keep open'''
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    for obj in inherited:
+        if isinstance(obj, int):
+            os.close(obj)
+        else:
+            obj.close()
+
+    batch.run_forked_job(job, run_job)
+
+
+def _remove_stale_socket(socket_path):
+    '''Removes socket_path if it is a socket nobody listens on,
+    raises OSError if it is something else or in use'''
+
+    if not osp.lexists(socket_path):
+        return
+
+    if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        raise OSError("'{0}' exists and is not a socket".format(socket_path))
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+            return
+
+    raise OSError("'{0}' is in use by another daemon".format(socket_path))
+
+
+def get_job(request):
+    '''Returns a BatchJob for the request, raises ValueError if it is not valid'''
+
+    if not isinstance(request, dict):
+        raise ValueError('Request must be a JSON object')
+
+    if 'jobDir' in request:
+        dirs = [request['jobDir']]
+    elif all(key in request for key in REQUEST_DIRS):
+        dirs = [request[key] for key in REQUEST_DIRS]
+    else:
+        raise ValueError("Request must have 'jobDir' or {0}".format(', '.join(REQUEST_DIRS)))
+
+    for _dir in dirs:
+        if not isinstance(_dir, str) or not osp.isabs(_dir):
+            raise ValueError("'{0}' is not an absolute path".format(_dir))
+
+    return batch.get_job([osp.normpath(_dir) for _dir in dirs])
+
+
+class Daemon:
+
+    def __init__(self, socket_path, max_jobs, run_job):
+        self.socket_path = socket_path
+        self.max_jobs = utillib.get_max_jobs(max_jobs)
+        self.run_job = run_job
+        self.min_memory = utillib.parse_size(os.getenv(batch.BATCH_MIN_MEMORY_ENV, '1G'))
+
+        self._mp_context = multiprocessing.get_context('fork')
+        self._selector = selectors.DefaultSelector()
+        self._requests = dict()
+        self._queue = deque()
+        self._running = dict()
+        self._server = None
+        self._stopping = False
+        self._wakeup_fds = None
+
+    def _send(self, conn, reply):
+        try:
+            conn.sendall((json.dumps(reply) + '\n').encode('utf-8'))
+        except OSError as err:
+            logging.info('DAEMON REPLY FAILED %s', err)
+
+    def _close(self, conn):
+        self._selector.unregister(conn)
+        self._requests.pop(conn, None)
+        conn.close()
+
+    def _accept(self, server):
+        conn, _ = server.accept()
+        conn.setblocking(False)
+        self._requests[conn] = b''
+        self._selector.register(conn, selectors.EVENT_READ, self._read)
+
+    def _read(self, conn):
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            data = b''
+
+        if not data:
+            self._close(conn)
+            return
+
+        self._requests[conn] += data
+        if b'\n' not in self._requests[conn]:
+            return
+
+        line = self._requests[conn].split(b'\n', 1)[0]
+        self._selector.unregister(conn)
+        self._requests.pop(conn)
+        conn.setblocking(True)
+
+        try:
+            job = get_job(json.loads(line.decode('utf-8')))
+        except ValueError as err:
+            self._send(conn, {'error': str(err)})
+            conn.close()
+            return
+
+        logging.info('DAEMON JOB QUEUED %s', job.job_dir)
+        self._queue.append((conn, job))
+
+    def _stop(self, signum, frame):
+        '''Signal handler, the loop stops once it is back in select'''
+
+        self._stopping = True
+        try:
+            os.write(self._wakeup_fds[1], b'\0')
+        except OSError:
+            pass
+
+    def _wakeup(self, fd):
+        try:
+            os.read(fd, 512)
+        except OSError:
+            pass
+
+    def _get_inherited(self, conn):
+        '''What a job forked for conn must close'''
+
+        inherited = [self._server, self._selector] + list(self._wakeup_fds)
+        inherited.extend(self._requests.keys())
+        inherited.extend(other_conn for other_conn, _ in self._queue)
+        inherited.extend(other_conn for _, other_conn, _ in self._running.values())
+
+        return [obj for obj in inherited if obj is not conn]
+
+    def _start_jobs(self):
+
+        while self._queue and len(self._running) < self.max_jobs \
+              and (not self._running or batch.can_start_job(self.min_memory)) \
+              and not self._stopping:
+            conn, job = self._queue.popleft()
+
+            batch.preload_job(job)
+
+            process = self._mp_context.Process(target=_run_forked_job,
+                                               args=(job, self.run_job,
+                                                     self._get_inherited(conn)))
+            process.start()
+            logging.info('DAEMON JOB START %d %s', process.pid, job.job_dir)
+
+            self._running[process.sentinel] = (process, conn, job)
+            self._selector.register(process.sentinel, selectors.EVENT_READ, self._job_done)
+            self._send(conn, {'pid': process.pid})
+
+    def _job_done(self, sentinel):
+        self._selector.unregister(sentinel)
+        process, conn, job = self._running.pop(sentinel)
+        process.join()
+
+        logging.info('DAEMON JOB END %d %s EXIT CODE %s',
+                     process.pid, job.job_dir, process.exitcode)
+        self._send(conn, {'exit-code': process.exitcode})
+        conn.close()
+
+    def serve(self):
+
+        _remove_stale_socket(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        # Removed on exit only if it is still the socket bound here
+        socket_ino = os.lstat(self.socket_path).st_ino
+        server.listen(64)
+        server.setblocking(False)
+        self._server = server
+        self._selector.register(server, selectors.EVENT_READ, self._accept)
+
+        # The signal handlers only set _stopping and wake up select
+        self._wakeup_fds = os.pipe()
+        os.set_blocking(self._wakeup_fds[1], False)
+        self._selector.register(self._wakeup_fds[0], selectors.EVENT_READ, self._wakeup)
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        logging.info('DAEMON LISTENING %s, MAX JOBS %d', self.socket_path, self.max_jobs)
+
+        try:
+            while not self._stopping:
+                self._start_jobs()
+
+                # Wake up now and then, admission control may let a queued job start
+                timeout = 1 if self._queue else None
+
+                for key, _ in self._selector.select(timeout):
+                    key.data(key.fileobj)
+
+            logging.info('DAEMON STOPPING, %d JOBS RUNNING', len(self._running))
+        finally:
+            self._selector.unregister(server)
+            server.close()
+
+            try:
+                if os.lstat(self.socket_path).st_ino == socket_ino:
+                    os.remove(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+            for conn, _ in self._queue:
+                self._send(conn, {'error': 'Daemon stopped'})
+                conn.close()
+
+            for sentinel in list(self._running.keys()):
+                self._job_done(sentinel)
+
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+            self._selector.unregister(self._wakeup_fds[0])
+            for fd in self._wakeup_fds:
+                os.close(fd)
+
+        return 0
+
+
+def main(socket_path, max_jobs, run_job):
+    '''run_job is called in a new process for every job with the
+    input, output, build, tool and results directories, and returns the exit code'''
+
+    batch.preload()
+    return Daemon(socket_path, max_jobs, run_job).serve()
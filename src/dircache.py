@@ -0,0 +1,315 @@
+'''
+Host wide cache of directory trees.
+
+The cache is enabled by setting the environment variable SWAMP_CACHE_DIR
+to a directory that is kept between assessment runs on the host.
+
+SWAMP_CACHE_MAX_SIZE: Maximum size of each cache in bytes (suffixes K, M, G
+                      are allowed), least recently used entries are
+                      removed when it is exceeded. Unlimited if not set.
+SWAMP_CACHE_LINK:     How the cached trees are put in place:
+                      'reflink' (default), 'hardlink' or 'copy'.
+                      'reflink' and 'hardlink' fall back to a copy if the
+                      filesystem does not support them. Use 'hardlink' only
+                      if the trees are never modified in place.
+
+Every entry has a lock file, an entry is only created, restored or
+evicted while holding its lock, so concurrent jobs on the
+same host can share a cache.
+'''
+
+import os
+import os.path as osp
+import shutil
+import subprocess
+import hashlib
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import utillib
+from .utillib import FileNotFoundException
+from .utillib import parse_size
+
+
+CACHE_DIR_ENV = 'SWAMP_CACHE_DIR'
+CACHE_MAX_SIZE_ENV = 'SWAMP_CACHE_MAX_SIZE'
+CACHE_LINK_ENV = 'SWAMP_CACHE_LINK'
+
+LINK_MODES = ['reflink', 'hardlink', 'copy']
+
+
+_file_digests = dict()
+
+
+def file_digest(filename):
+    '''sha256 hex digest of the contents of the file,
+    remembered as long as the file is not modified'''
+
+    stat = os.stat(filename)
+    digest_key = (osp.realpath(filename), stat.st_size, stat.st_mtime)
+
+    if digest_key not in _file_digests:
+        sha = hashlib.sha256()
+        with open(filename, 'rb') as fobj:
+            for block in iter(lambda: fobj.read(1024 * 1024), b''):
+                sha.update(block)
+
+        _file_digests[digest_key] = sha.hexdigest()
+
+    return _file_digests[digest_key]
+
+
+def make_key(*parts):
+    '''Combines parts (strings) into a key'''
+
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(str(part).encode('utf-8'))
+        sha.update(b'\0')
+
+    return sha.hexdigest()
+
+
+def tree_size(root_dir):
+    size = 0
+    for dirpath, _, filenames in os.walk(root_dir):
+        for _file in filenames:
+            size += os.lstat(osp.join(dirpath, _file)).st_size
+    return size
+
+
+def _copy_file(src, dest, hardlink):
+    '''Returns False if hardlinking is not possible and the file was copied'''
+
+    if osp.lexists(dest):
+        os.remove(dest)
+
+    if osp.islink(src):
+        os.symlink(os.readlink(src), dest)
+    elif hardlink:
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+            return False
+    else:
+        shutil.copy2(src, dest)
+
+    return hardlink
+
+
+def copy_tree(src_dir, dest_dir, link_mode='copy'):
+    '''Copies the contents of src_dir into dest_dir, dest_dir may already exist'''
+
+    if not osp.isdir(dest_dir):
+        os.makedirs(dest_dir)
+
+    if link_mode == 'reflink':
+        if subprocess.call(['cp', '-a', '--reflink=always',
+                            osp.join(src_dir, '.'), dest_dir],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL) == 0:
+            return
+
+    hardlink = (link_mode == 'hardlink')
+
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        target_dir = osp.normpath(osp.join(dest_dir, osp.relpath(dirpath, src_dir)))
+
+        for _dir in dirnames:
+            if osp.islink(osp.join(dirpath, _dir)):
+                _copy_file(osp.join(dirpath, _dir), osp.join(target_dir, _dir), False)
+            elif not osp.isdir(osp.join(target_dir, _dir)):
+                os.mkdir(osp.join(target_dir, _dir))
+
+        for _file in filenames:
+            hardlink = _copy_file(osp.join(dirpath, _file),
+                                  osp.join(target_dir, _file),
+                                  hardlink)
+
+        shutil.copystat(dirpath, target_dir)
+
+
+class CacheEntry:
+
+    def __init__(self, dir_cache, key):
+        self._cache = dir_cache
+        self.key = key
+        self.path = osp.join(dir_cache.cache_dir, key)
+        self._size_file = self.path + '.size'
+
+    def exists(self):
+        return osp.isdir(self.path) and osp.isfile(self._size_file)
+
+    @property
+    def link_mode(self):
+        return self._cache.link_mode
+
+    def touch(self):
+        '''Marks the entry as recently used'''
+        os.utime(self._size_file, None)
+
+    def restore(self, dest_dir, link_mode=None):
+        '''Puts the cached tree in dest_dir, with link_mode
+        instead of the cache's link mode if it is given'''
+
+        copy_tree(self.path, dest_dir, link_mode or self._cache.link_mode)
+        self.touch()
+
+    def create(self, populate):
+        '''populate is a function that takes a directory path, fills it
+        and returns an exit code. The entry is added only if it returns 0'''
+
+        tmp_dir = '{0}.tmp-{1}'.format(self.path, utillib.get_uuid())
+        os.makedirs(tmp_dir)
+
+        try:
+            exit_code = populate(tmp_dir)
+
+            if exit_code == 0:
+                if osp.isdir(self.path):
+                    shutil.rmtree(self.path)
+
+                os.rename(tmp_dir, self.path)
+                with open(self._size_file, 'w') as fobj:
+                    print(tree_size(self.path), file=fobj)
+        finally:
+            if osp.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return exit_code
+
+    def store(self, src_dir):
+        '''Adds a copy of the tree src_dir'''
+
+        # Never hardlink here, src_dir is still used and may be modified
+        link_mode = 'reflink' if self._cache.link_mode == 'reflink' else 'copy'
+
+        def populate(tmp_dir):
+            copy_tree(src_dir, tmp_dir, link_mode)
+            return 0
+
+        return self.create(populate)
+
+
+class DirCache:
+
+    EVICT_LOCK = '.evict.lock'
+
+    def __init__(self, cache_dir, max_size=None, link_mode='reflink'):
+
+        if link_mode not in LINK_MODES:
+            raise ValueError('Unknown cache link mode {0}, it should be one of {1}'.format(link_mode,
+                                                                                        LINK_MODES))
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.link_mode = link_mode
+
+        if not osp.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @contextmanager
+    def _lock(self, lock_file, blocking=True):
+        with open(lock_file, 'a') as fobj:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+
+            try:
+                fcntl.flock(fobj, flags)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(fobj, fcntl.LOCK_UN)
+
+    @contextmanager
+    def entry(self, key):
+        '''Holds the lock on the entry 'key' and returns the CacheEntry'''
+
+        with self._lock(osp.join(self.cache_dir, key + '.lock')):
+            yield CacheEntry(self, key)
+
+        self.evict()
+
+    def evict(self):
+        '''Removes least recently used entries until the cache fits in max_size,
+        entries that are locked by someone are skipped'''
+
+        if not self.max_size:
+            return
+
+        with self._lock(osp.join(self.cache_dir, DirCache.EVICT_LOCK)):
+            entries = list()
+            for _file in os.listdir(self.cache_dir):
+                if _file.endswith('.size'):
+                    size_file = osp.join(self.cache_dir, _file)
+                    try:
+                        with open(size_file) as fobj:
+                            size = int(fobj.read().strip())
+                        entries.append((os.stat(size_file).st_mtime,
+                                        _file[:-len('.size')], size))
+                    except (OSError, ValueError):
+                        continue
+
+            total_size = sum(size for _, _, size in entries)
+
+            for _, key, size in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+
+                with self._lock(osp.join(self.cache_dir, key + '.lock'),
+                                blocking=False) as locked:
+                    if locked:
+                        logging.info('CACHE EVICT %s', osp.join(self.cache_dir, key))
+                        os.remove(osp.join(self.cache_dir, key + '.size'))
+                        shutil.rmtree(osp.join(self.cache_dir, key), ignore_errors=True)
+                        total_size -= size
+
+
+def get_cache(name):
+    '''Returns the DirCache 'name', None if caching is not configured'''
+
+    cache_root = os.getenv(CACHE_DIR_ENV)
+
+    if not cache_root or fcntl is None:
+        return None
+
+    return DirCache(osp.join(cache_root, name),
+                    parse_size(os.getenv(CACHE_MAX_SIZE_ENV)),
+                    os.getenv(CACHE_LINK_ENV, 'reflink'))
+
+
+def unpack_archive(archive, dirpath):
+    '''Same as utillib.unpack_archive, but the archive is
+    unpacked only once per host if caching is configured'''
+
+    unpack_cache = get_cache('unpack')
+
+    if unpack_cache is None:
+        return utillib.unpack_archive(archive, dirpath)
+
+    if not osp.isfile(archive):
+        raise FileNotFoundException(archive)
+
+    # The name is in the key as the extension decides how it is unpacked
+    key = make_key(file_digest(archive), osp.basename(archive))
+
+    with unpack_cache.entry(key) as entry:
+        if not entry.exists():
+            exit_code = entry.create(lambda tmp_dir: utillib.unpack_archive(archive, tmp_dir))
+
+            if exit_code != 0:
+                return exit_code
+        else:
+            logging.info('UNPACK CACHE HIT %s', archive)
+
+        entry.restore(dirpath)
+
+    return 0
@@ -1,182 +1,361 @@
 import os
 import os.path as osp
-import glob
+import re
+import functools
+import concurrent.futures
 from collections import namedtuple
 
 from . import utillib
 from . import gencmd
 
 
-FileFilters = namedtuple('FileFilters', ['exclude_dirs', 'exclude_files',
-                                         'include_dirs', 'include_files'])
+# Number of threads that read the directories of the package,
+# 'auto' for the number of cpus. One by default
+SCAN_THREADS_ENV = 'SWAMP_SCAN_THREADS'
 
 
-def os_path_join(basepath, subdir):
-    if subdir.startswith('/'):
-        return osp.normpath(osp.join(basepath, subdir[1:]))
-    else:
-        return osp.normpath(osp.join(basepath, subdir))
+def _translate_glob(segment):
+    '''Regular expression for a path segment of a gitignore pattern'''
 
+    regex = ''
+    i = 0
 
-def glob_glob(path, pattern):
-    return glob.glob(os_path_join(path, pattern))
+    while i < len(segment):
+        char = segment[i]
+        i += 1
 
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '\\' and i < len(segment):
+            regex += re.escape(segment[i])
+            i += 1
+        elif char == '[':
+            end = i + 1 if segment[i:i + 1] in ['!', '^'] else i
+            end = segment.find(']', end + 1 if segment[end:end + 1] == ']' else end)
 
-def expand_patterns(root_dir, pattern_list):
-    for pattern in pattern_list:
-        if '**' in pattern:
-            head, _, tail = pattern.partition('**')
-            tail = tail[1:] if tail.startswith('/') else tail
-            if tail in ['', '*.*', '*']:
-                yield glob_glob(root_dir, head)
+            if end == -1:
+                regex += re.escape(char)
             else:
-                for dirpath, _, _ in os.walk(os_path_join(root_dir, head)):
-                    yield glob_glob(dirpath, tail)
+                chars = segment[i:end].replace('\\', '\\\\')
+                if chars[:1] in ['!', '^']:
+                    chars = '^' + chars[1:]
+                regex += '(?!/)[' + chars + ']'
+                i = end + 1
+        else:
+            regex += re.escape(char)
+
+    return regex
+
+
+IgnorePattern = namedtuple('IgnorePattern', ['pattern', 'regex', 'negated', 'dir_only'])
+
+
+def parse_ignore_pattern(line):
+    '''Returns an IgnorePattern for a line of a .gitignore file, None for
+    blank lines and comments. A pattern with a / before the end is relative
+    to the root directory, otherwise it matches at any depth'''
+
+    pattern = line.strip()
+
+    if not pattern or pattern.startswith('#'):
+        return None
+
+    negated = pattern.startswith('!')
+    if negated:
+        pattern = pattern[1:]
+    elif pattern[:2] in ['\\!', '\\#']:
+        pattern = pattern[1:]
+
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+
+    if not pattern:
+        return None
+
+    anchored = '/' in pattern
+    segments = pattern.lstrip('/').split('/')
+
+    regex = '' if anchored else '(?:.*/)?'
+
+    for index, segment in enumerate(segments):
+        last = (index == len(segments) - 1)
+
+        if segment == '**':
+            # a/** matches everything in a, **/a and a/**/b any number of directories
+            regex += '.+' if last else '(?:.*/)?'
         else:
-            yield glob_glob(root_dir, pattern)
+            regex += _translate_glob(segment) + ('' if last else '/')
+
+    return IgnorePattern(line.strip(), regex, negated, dir_only)
+
+
+class IgnoreMatcher:
+    '''
+    Matches paths relative to a root directory (with / separators)
+    against gitignore patterns, the last pattern that matches decides.
+    The patterns are compiled into one regular expression for files
+    and one for directories
+    '''
+
+    def __init__(self, patterns):
+        self.patterns = [pattern for pattern in (parse_ignore_pattern(line)
+                                                 for line in patterns)
+                         if pattern is not None]
+
+        self._file_regex, self._file_negated = \
+            self._compile([p for p in self.patterns if not p.dir_only])
+        self._dir_regex, self._dir_negated = self._compile(self.patterns)
+
+    @staticmethod
+    def _compile(patterns):
+        '''The group of an alternative is its position in reversed patterns,
+        the first alternative that matches is the last pattern'''
+
+        if not patterns:
+            return (None, None)
+
+        patterns = list(reversed(patterns))
+        regex = '|'.join('({0})'.format(pattern.regex) for pattern in patterns)
+
+        return (re.compile(regex, re.DOTALL),
+                [None] + [pattern.negated for pattern in patterns])
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def match(self, relpath, is_dir=False):
+        '''True if relpath is ignored, without looking at its parent directories'''
+
+        regex, negated = (self._dir_regex, self._dir_negated) if is_dir \
+            else (self._file_regex, self._file_negated)
+
+        if regex is None:
+            return False
+
+        match = regex.fullmatch(relpath)
+        return match is not None and not negated[match.lastindex]
+
+    def is_ignored(self, relpath):
+        '''True if the file relpath or one of its parent directories is ignored,
+        a file in an ignored directory cannot be included again'''
+
+        parts = relpath.split('/')
+
+        for index in range(1, len(parts)):
+            if self.match('/'.join(parts[:index]), True):
+                return True
+
+        return self.match(relpath)
 
 
-def get_file_filters(root_dir, patterns):
-    '''Returns an FileFilters object'''
+def get_ignore_matcher(patterns):
+    '''Returns an IgnoreMatcher, patterns is a list of patterns,
+    a file with a pattern on each line, or None'''
 
-    # patterns is expected to be a list or filepath
     if isinstance(patterns, str):
         with open(patterns) as fobj:
             patterns = [p for p in fobj]
     elif patterns is None:
         patterns = []
 
-    patterns = {p.strip().strip('\n') for p in patterns
-                if p and not p.isspace() and not p.strip().startswith('#')}
+    return IgnoreMatcher(patterns)
 
-    ex_dir_list = set()
-    ex_file_list = set()
 
-    for fileset in expand_patterns(root_dir,
-                                   (p for p in patterns
-                                    if not p.startswith('!'))):
-        if fileset:
-            for _file in fileset:
-                if osp.isdir(_file):
-                    ex_dir_list.add(osp.normpath(_file))
-                else:
-                    ex_file_list.add(osp.normpath(_file))
+def get_exclude_patterns(exclude_paths):
+    '''Patterns for exclude_paths, a comma separated list of
+    paths (glob patterns) relative to the package directory'''
 
-    in_dir_list = set()
-    in_file_list = set()
+    patterns = list()
 
-    for fileset in expand_patterns(root_dir,
-                                   (p[1:] for p in patterns
-                                    if p.startswith('!'))):
-        if fileset:
-            for _file in fileset:
-                if osp.isdir(_file):
-                    in_dir_list.add(osp.normpath(_file))
-                else:
-                    in_file_list.add(osp.normpath(_file))
+    for path in exclude_paths.split(','):
+        path = path.strip()
 
-    return FileFilters(ex_dir_list, ex_file_list, in_dir_list, in_file_list)
+        if path.startswith('!'):
+            patterns.append('!/' + path[1:].lstrip('/'))
+        elif path:
+            patterns.append('/' + path.lstrip('/'))
 
+    return patterns
 
-def filter_out(root_dir, file_filters, file_extentions):
+
+def _scan_dir(dirpath, reldir, ignore_matcher):
+    '''Returns (files, subdirs) for the directory dirpath, see walk,
+    subdirs being (path, relative path) pairs. None if it cannot be read'''
+
+    try:
+        with os.scandir(dirpath) as dir_iter:
+            entries = sorted(dir_iter, key=lambda entry: entry.name)
+    except OSError:
+        return None
+
+    files = list()
+    subdirs = list()
+
+    for entry in entries:
+        relpath = reldir + entry.name
+
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+
+        if not is_dir:
+            if not (ignore_matcher and ignore_matcher.match(relpath)):
+                files.append(entry)
+        elif not (entry.name.startswith('.') or
+                  entry.is_symlink() or
+                  (ignore_matcher and ignore_matcher.match(relpath, True))):
+            subdirs.append((entry.path, relpath + '/'))
+
+    return (files, subdirs)
+
+
+def walk(root_dir, ignore_matcher=None):
     '''
     This is a generator function.
-    os.walk with directories in file_filters.exclude_dirs and
-    file_filters.exclude_files and hidden (begin with .) are ignored
+    Like os.walk, yields (dirpath, files) for root_dir and its subdirectories,
+    files being the os.DirEntry of the files in dirpath sorted by name.
+    Hidden directories (begin with .) and directories that ignore_matcher
+    ignores are not descended into, files it ignores are left out.
+    Symbolic links to directories are neither files nor followed,
+    unreadable directories are skipped
     '''
 
-    def is_dirpath_in(dirpath, dir_list):
-        return any(dirpath.startswith(path) for path in dir_list) \
-            if dir_list else False
+    # (path, path relative to root_dir with / separators)
+    dir_stack = [(osp.normpath(root_dir), '')]
 
-    hidden_dir_list = []
+    while dir_stack:
+        dirpath, reldir = dir_stack.pop()
+        scan = _scan_dir(dirpath, reldir, ignore_matcher)
 
-    for dirpath, _, filenames in os.walk(root_dir):
+        if scan is not None:
+            files, subdirs = scan
+            yield (dirpath, files)
 
-        if osp.basename(dirpath).startswith('.'):
-            hidden_dir_list.append(dirpath)
-        elif not (is_dirpath_in(osp.join(dirpath, ''), file_filters.exclude_dirs) or
-                  is_dirpath_in(osp.join(dirpath, ''), hidden_dir_list)):
-            filepaths = {osp.normpath(osp.join(dirpath, _file))
-                         for _file in filenames
-                         if not _file.startswith('.') and
-                         (osp.splitext(_file)[1] in file_extentions)}
-            filepaths = filepaths.difference(file_filters.exclude_files)
-            if filepaths:
-                for _file in filepaths:
-                    yield _file
+            # Top-down, in the order of the names
+            dir_stack.extend(reversed(subdirs))
 
 
-def filter_in(file_filters, file_extentions):
+def parallel_walk(root_dir, ignore_matcher=None, max_workers=None):
     '''
     This is a generator function.
+    Same as walk, with the same results in the same order, but directories
+    are read by a pool of max_workers threads as soon as their parent
+    has been read. For large trees on filesystems with a slow stat,
+    network or overlay filesystems
     '''
 
-    for include_dir in file_filters.include_dirs:
-        for dirpath, _, filenames in os.walk(include_dir):
-            for _file in filenames:
-                if osp.splitext(_file)[1] in file_extentions:
-                    yield osp.join(dirpath, _file)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(dirpath, reldir):
+            return (dirpath, executor.submit(_scan_dir, dirpath, reldir, ignore_matcher))
+
+        future_stack = [submit(osp.normpath(root_dir), '')]
+
+        try:
+            while future_stack:
+                dirpath, future = future_stack.pop()
+                scan = future.result()
+
+                if scan is not None:
+                    files, subdirs = scan
+
+                    # Start reading the subdirectories before the caller
+                    # gets this one
+                    future_stack.extend(reversed([submit(subdir, relsubdir)
+                                                  for subdir, relsubdir in subdirs]))
+                    yield (dirpath, files)
+        finally:
+            # If the caller stops early, only the running scans are waited for.
+            # Same as shutdown(cancel_futures=True), that needs Python 3.9
+            for _, future in future_stack:
+                future.cancel()
+
+
+def get_walk(scan_threads=None):
+    '''Returns walk, or parallel_walk if the number of threads
+    (scan_threads, or SWAMP_SCAN_THREADS if None) is more than 1'''
+
+    if scan_threads is None:
+        scan_threads = os.getenv(SCAN_THREADS_ENV)
+
+    scan_threads = utillib.get_max_jobs(scan_threads)
+
+    if scan_threads > 1:
+        return functools.partial(parallel_walk, max_workers=scan_threads)
+    else:
+        return walk
 
-    for _file in file_filters.include_files:
-        if osp.isfile(_file) and \
-           osp.splitext(_file)[1] in file_extentions:
-            yield _file
+
+def filter_out(root_dir, ignore_matcher, file_extentions):
+    '''
+    This is a generator function.
+    Walks root_dir and yields the os.DirEntry of the files, files and
+    directories that ignore_matcher ignores and hidden ones (begin with .)
+    are left out
+    '''
+
+    for _, files in get_walk()(root_dir, ignore_matcher):
+        for entry in files:
+            if not entry.name.startswith('.') and \
+               osp.splitext(entry.name)[1] in file_extentions:
+                yield entry
 
 
 def get_file_list(root_dir, patterns, file_extentions):
     '''
-    In the root_dir path, applies patterns and returns the list of files matching the extensions in file_extentions
+    In the root_dir path, applies patterns (gitignore patterns, see get_ignore_matcher)
+    and returns the list of files matching the extensions in file_extentions
     '''
 
-    file_filters = get_file_filters(root_dir, patterns)
+    return [entry.path for entry in get_file_entries(root_dir, patterns, file_extentions)]
 
-    file_list = list()
-    file_list.extend(filter_out(root_dir, file_filters, file_extentions))
-    file_list.extend(filter_in(file_filters, file_extentions))
 
-    return file_list
+def get_file_entries(root_dir, patterns, file_extentions):
+    '''Same as get_file_list, but returns the os.DirEntry of the files,
+    their stat is kept from the walk'''
+
+    return list(filter_out(root_dir, get_ignore_matcher(patterns), file_extentions))
 
 
 def filter_file_list(file_list, root_dir, patterns):
-    ''' 
-    Given a set of files (file_list), excludes the files matching the patterns and returns a new file list
+    '''
+    Given a set of files (file_list) in root_dir, excludes the files matching the patterns
+    (gitignore patterns, see get_ignore_matcher) and returns a new file list
     '''
 
-    file_filters = get_file_filters(root_dir, patterns)
-
-    new_file_list = set(file_list).difference(file_filters.exclude_files)
-
-    def is_file_in(filepath, dir_list):
-        return any(filepath.startswith(osp.join(path, ''))
-                   for path in dir_list) if dir_list else False
+    ignore_matcher = get_ignore_matcher(patterns)
 
-    new_file_list = new_file_list.difference({_file for _file in new_file_list
-                                              if is_file_in(_file, file_filters.exclude_dirs)})
+    if not ignore_matcher:
+        return list(set(file_list))
 
-    return list(new_file_list)
+    return [_file for _file in set(file_list)
+            if not ignore_matcher.is_ignored(osp.relpath(_file, root_dir).replace(os.sep, '/'))]
 
 #########################
 
 
 def is_chunking_commands_required(invoke_file,
                                   artifacts_dict,
-                                  keys):
+                                  keys,
+                                  env=None):
     '''returns a tuple with key in attribute and an integer corresponding
-    to the size '''
-
-    def get_cmd_size(_dict):
-        return len(' '.join(gencmd.gencmd(invoke_file, _dict)))
+    to the size, in bytes as counted by utillib.get_arg_size, left for the
+    files in keys when the command is run with env (os.environ if None)'''
 
-    artifacts_local = dict(artifacts_dict)
+    template = gencmd.get_template(invoke_file)
+    max_cmd_size = utillib.max_cmd_size(env)
 
-    if get_cmd_size(artifacts_local) > utillib.max_cmd_size():
+    if template.get_arg_size(artifacts_dict) > max_cmd_size \
+       or template.get_max_arg_len(artifacts_dict) >= utillib.MAX_ARG_STRLEN:
 
         # Remove all the artifacts that the tool works on, and then check the size
-        for key in keys:
-            artifacts_local.pop(key)
+        artifacts_local = {key: value for key, value in artifacts_dict.items()
+                           if key not in keys}
 
-        return (True, utillib.max_cmd_size() - get_cmd_size(artifacts_local))
+        return (True, max_cmd_size - template.get_arg_size(artifacts_local))
     else:
         return (False, -1)
 
@@ -200,22 +379,41 @@ def split_file_list_old(file_list, max_size, sep=' '):
 
 def chunk_file_list(file_list, max_size, sep=' '):
     '''
-    Split file_list
+    Split file_list into lists of files that take at most max_size bytes as
+    arguments of a command, see utillib.get_arg_size. sep is the separator
+    of the parameter the files are passed with, see utillib.process_parameter
     '''
 
+    if sep is None or sep == ' ':
+        # An argument for each file
+        def file_size(_file):
+            return utillib.get_arg_size([_file])
+    elif sep.strip() == sep:
+        # A single argument with all the files, it cannot be longer than MAX_ARG_STRLEN,
+        # leave some room for an option name before the files
+        max_size = min(max_size - utillib.get_arg_size(['']),
+                       utillib.MAX_ARG_STRLEN - 1024)
+
+        def file_size(_file):
+            return len(os.fsencode(_file)) + len(sep)
+    else:
+        # An argument for each file and each separator
+        def file_size(_file):
+            return utillib.get_arg_size([_file, sep.strip()])
+
     sub_list = list()
     list_size = 0
-    len_sep = len(sep)
 
     for _file in file_list:
-        if (list_size + len_sep + len(_file) < max_size):
-            sub_list.append(_file)
-            list_size = list_size + len_sep + len(_file)
-        else:
+        size = file_size(_file)
+
+        if sub_list and (list_size + size > max_size):
             yield sub_list
-            sub_list.clear()
-            sub_list.append(_file)
-            list_size = len(_file)
+            sub_list = list()
+            list_size = 0
+
+        sub_list.append(_file)
+        list_size += size
 
     if len(sub_list):
         yield sub_list
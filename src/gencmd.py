@@ -1,6 +1,8 @@
 import sys
+import os
 import os.path as osp
 import logging
+import threading
 
 from collections import namedtuple
 
@@ -38,9 +40,36 @@ def t_error(t):
     logging.error("Lexer: Illegal character " + t.value)
     t.lexer.skip(1)
 
-lexer = lex.lex(lextab='gencmd_lextab',
-                debuglog=logging.getLogger(''),
-                errorlog=logging.getLogger(''))
+# The lexer and the parser keep state while parsing,
+# tools running in threads share them under this lock
+_parse_lock = threading.Lock()
+
+# The lexer and parser tables are generated at release time (write_tables)
+# and shipped with the module, they are loaded on first use.
+# Set to get the ply debug output in debug.out and parser.out
+GENCMD_DEBUG_ENV = 'SWAMP_GENCMD_DEBUG'
+
+LEXTAB = 'gencmd_lextab'
+PARSETAB = 'gencmd_parsetab'
+
+_lexer = None
+_parser = None
+
+
+def _get_lexer():
+    '''Call with _parse_lock held'''
+
+    global _lexer
+
+    if _lexer is None:
+        debug = bool(os.getenv(GENCMD_DEBUG_ENV))
+        _lexer = lex.lex(module=sys.modules[__name__],
+                         optimize=not debug,
+                         debug=debug,
+                         lextab=LEXTAB,
+                         debuglog=logging.getLogger(''),
+                         errorlog=logging.getLogger(''))
+    return _lexer
 
 
 def get_string(arg):
@@ -59,13 +88,15 @@ def tokenize(input_str):
     the given input string
     '''
     result = list()
-    lexer.lineno = 1
-    lexer.input(input_str)
-    for tok in lexer:
-        if not tok:
-            break
-        else:
-            result.append((tok.type, tok.value))
+    with _parse_lock:
+        lexer = _get_lexer()
+        lexer.lineno = 1
+        lexer.input(input_str)
+        for tok in lexer:
+            if not tok:
+                break
+            else:
+                result.append((tok.type, tok.value))
     return result
 
 
@@ -163,16 +194,54 @@ def _get_param(param):
     return (name, op, text)
 
 
-parser = yacc.yacc(debug=True,
-                   tabmodule='gencmd_parsetab',
-                   start='command',
-                   debuglog=logging.getLogger(''),
-                   errorlog=logging.getLogger(''))
+def _get_parser():
+    '''Call with _parse_lock held. If the shipped tables do not match the
+    grammar, the parser is built in memory, the tables are not written'''
+
+    global _parser
+
+    if _parser is None:
+        debug = bool(os.getenv(GENCMD_DEBUG_ENV))
+        _parser = yacc.yacc(module=sys.modules[__name__],
+                            debug=debug,
+                            write_tables=False,
+                            tabmodule=PARSETAB,
+                            start='command',
+                            errorlog=logging.getLogger(''))
+    return _parser
 
 
 def parse_str(input_str):
     '''Returns AST'''
-    return parser.parse(input_str, lexer=lexer)
+    with _parse_lock:
+        return _get_parser().parse(input_str, lexer=_get_lexer())
+
+
+def load():
+    '''Builds the lexer and parser now instead of on first use,
+    batch and daemon modes call it before forking the jobs'''
+
+    with _parse_lock:
+        _get_lexer()
+        _get_parser()
+
+
+def write_tables(outputdir=None):
+    '''Generates the lexer and parser table modules in outputdir,
+    the directory of this module by default. Run at release time'''
+
+    if outputdir is None:
+        outputdir = osp.dirname(osp.abspath(__file__))
+
+    module = sys.modules[__name__]
+
+    for tabmodule in [LEXTAB, PARSETAB]:
+        if osp.isfile(osp.join(outputdir, tabmodule + '.py')):
+            os.remove(osp.join(outputdir, tabmodule + '.py'))
+
+    lex.lex(module=module, optimize=True, lextab=LEXTAB, outputdir=outputdir)
+    yacc.yacc(module=module, debug=False, tabmodule=PARSETAB, start='command',
+              outputdir=outputdir)
 
 
 def process_obj(obj, symbol_table):
@@ -229,21 +298,102 @@ def process_quotedstring(string_template, symbol_table):
     return utillib.string_substitute(string_template, symbol_table)[1:-1]
 
 
-def gencmd(str_or_file, symbol_table):
-    '''str_or_file: Can be a file or a string'''
-    input_str = get_string(str_or_file)
-    ast = parse_str(input_str)
+GenCmdVar = namedtuple('GenCmdVar', ['name', 'text'])
+
+
+def _blen(string):
+    '''Length of the string as an argument of execve'''
+
+    # str.isascii is in Python 3.7 and later
+    if hasattr(str, 'isascii') and string.isascii():
+        return len(string)
+
+    return len(os.fsencode(string))
+
+
+def _value_size(obj, symbol_table):
+    '''Returns (number of arguments, total length, longest argument) of what
+    process_obj returns for obj, None if it returns None, without building
+    the arguments for list parameters'''
+
+    if obj is None:
+        return None
+
+    if obj[0] == 'parameter' and obj[2] == '%' \
+       and isinstance(symbol_table.get(obj[1]), list):
+        values = symbol_table[obj[1]]
+        text = obj[3]
+        lengths = [_blen(val) for val in values]
+        num_seps = max(len(values) - 1, 0)
+
+        if text == ' ':
+            return (len(values), sum(lengths), max(lengths, default=0))
+        elif not text.isspace() and text.strip() == text:
+            length = sum(lengths) + num_seps * _blen(text)
+            return (1, length, length)
+        elif not text.isspace():
+            return (len(values) + num_seps,
+                    sum(lengths) + num_seps * _blen(text.strip()),
+                    max(lengths + [_blen(text.strip())]))
+
+    if obj[0] == 'option' and obj[3] is not None:
+        name, sep, val = obj[1:]
+        val_size = _value_size(val, symbol_table)
+
+        if val_size is None:
+            return None
+        elif sep is None:
+            return (1 + val_size[0], _blen(name) + val_size[1], max(_blen(name), val_size[2]))
+        else:
+            length = _blen(name) + _blen(sep) + val_size[1]
+            return (1, length, length)
+
+    val = process_obj(obj, symbol_table)
+
+    if val is None:
+        return None
+    elif isinstance(val, str):
+        return (1, _blen(val), _blen(val))
+    else:
+        lengths = [_blen(_val) for _val in val]
+        return (len(val), sum(lengths), max(lengths, default=0))
+
+
+class CommandTemplate:
+    '''An invoke file or string parsed once, see get_template'''
+
+    def __init__(self, input_str):
+        ast = parse_str(input_str)
+
+        if not (isinstance(ast, tuple) and (ast[0] == 'command')):
+            raise Exception('AST not correct')
+
+        self._exe = ast[1]
+        self._args = ast[2]
+
+        def get_params(obj):
+            if obj is None:
+                return
+            elif obj[0] == 'parameter':
+                yield GenCmdVar(obj[1], obj[3])
+            elif obj[0] == 'option':
+                yield from get_params(obj[3])
+
+        self.variables = [var for obj in [self._exe] + self._args
+                          for var in get_params(obj)]
+
+    def render(self, symbol_table):
+        '''Returns the command as a list'''
 
-    if isinstance(ast, tuple) and (ast[0] == 'command'):
         cmd = list()
-        exe = process_obj(ast[1], symbol_table)
+        exe = process_obj(self._exe, symbol_table)
 
         if (exe is None) or (not isinstance(exe, str)):
             raise Exception('No valid executable in the command')
         else:
             cmd.append(exe)
 
-        for arg in ast[2]:
+        for arg in self._args:
             val = process_obj(arg, symbol_table)
             if isinstance(val, str):
                 cmd.append(val)
@@ -252,25 +402,59 @@ def gencmd(str_or_file, symbol_table):
 
         # return [arg.strip() for arg in cmd if arg is not None]
         return cmd
+
+    def _get_sizes(self, symbol_table):
+        return [size for size in (_value_size(obj, symbol_table)
+                                  for obj in [self._exe] + self._args)
+                if size is not None]
+
+    def get_arg_size(self, symbol_table):
+        '''Same as utillib.get_arg_size(self.render(symbol_table))'''
+
+        sizes = self._get_sizes(symbol_table)
+        return sum(length for _, length, _ in sizes) \
+            + sum(num_args for num_args, _, _ in sizes) * (1 + utillib.POINTER_SIZE)
+
+    def get_max_arg_len(self, symbol_table):
+        '''Length of the longest argument of self.render(symbol_table)'''
+        return max((longest for _, _, longest in self._get_sizes(symbol_table)), default=0)
+
+
+# Templates are kept by their text, so that the jobs forked from a batch
+# or daemon process (see batch.preload_job) share them even if the files
+# are in different directories
+_templates = dict()
+_template_files = dict()
+
+
+def get_template(str_or_file):
+    '''Returns the CommandTemplate for a file or a string, a file is
+    read again only if it is modified'''
+
+    if osp.isfile(str_or_file):
+        stat = os.stat(str_or_file)
+        key = (osp.realpath(str_or_file), stat.st_size, stat.st_mtime)
+
+        if key not in _template_files:
+            _template_files[key] = get_string(str_or_file)
+
+        input_str = _template_files[key]
     else:
-        raise Exception('AST not correct')
+        input_str = str_or_file
 
+    if input_str not in _templates:
+        _templates[input_str] = CommandTemplate(input_str)
 
-GenCmdVar = namedtuple('GenCmdVar', ['name', 'text'])
+    return _templates[input_str]
+
+
+def gencmd(str_or_file, symbol_table):
+    '''str_or_file: Can be a file or a string'''
+    return get_template(str_or_file).render(symbol_table)
 
 
 def get_cmd_var_list(filename):
-    _tokens = tokenize(get_string(filename))
-    param_list = list()
-
-    for name, value in _tokens:
-        if name == 'PARAM':
-            m = utillib.PARAM_REGEX.match(value)
-            # if m is not None and 'name' in m.groupdict():
-            if m and 'name' in m.groupdict():
-                param_list.append((GenCmdVar(m.groupdict()['name'],
-                                             m.groupdict().get('text', None))))
-    return param_list
+    return list(get_template(filename).variables)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,10 @@
+# gencmd_lextab.py. This file automatically created by PLY (version 3.8). Don't edit!
+_tabversion   = '3.8'
+_lextokens    = {'NEWLINE', 'OPTIONNAME', 'QSTRING', 'SEPERATER', 'STRING', 'PARAM'}
+_lexreflags   = 0
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_NEWLINE>\\n+)|(?P<t_PARAM><[a-zA-Z][a-zA-Z0-9-_]*(?:(?:%|\\?\\+|\\?-)[^>]+)?>)|(?P<t_OPTIONNAME>(-{1,2}|[+])[a-zA-Z][a-zA-Z0-9-_]*)|(?P<t_QSTRING>[\\"][^\\"]+[\\"])|(?P<t_STRING>[\\w\\d\\.-]+)|(?P<t_SEPERATER>[:=/])', [None, ('t_NEWLINE', 'NEWLINE'), (None, 'PARAM'), (None, 'OPTIONNAME'), None, (None, 'QSTRING'), (None, 'STRING'), (None, 'SEPERATER')])]}
+_lexstateignore = {'INITIAL': ' \t\x0b\r'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
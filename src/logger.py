@@ -159,7 +159,9 @@ class LogTaskStatus():
         if exception:
             exit_code = exception.errno if(hasattr(exception, 'errno')) else 1
             msg_indetail = str(exception) if str(exception) != "None" else None
-            self.update_task_status(exit_code, None, msg_indetail)
+            self.update_task_status(exit_code,
+                                    getattr(exception, 'msg_inline', None),
+                                    msg_indetail)
 
         self.write(exception and hasattr(exception, 'retry') and exception.retry is True)
 
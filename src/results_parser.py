@@ -6,6 +6,7 @@ import re
 
 from .logger import LogTaskStatus
 from . import utillib
+from . import dircache
 from . import confreader
 from .utillib import FileNotFoundException
 
@@ -36,7 +37,8 @@ def just_parse(input_root_dir, output_root_dir):
                          output_root_dir)
 
 
-def _get_results_parser(input_dir):
+def get_results_parser(input_dir):
+    '''Unarchives the result parser, returns the path of its executable'''
 
     with LogTaskStatus('resultparser-unarchive'):
 
@@ -54,7 +56,7 @@ def _get_results_parser(input_dir):
 
         parser_archive = osp.join(input_dir, parser_attr['result-parser-archive'])
 
-        utillib.unpack_archive(parser_archive, parser_dir)
+        dircache.unpack_archive(parser_archive, parser_dir)
 
         parser_dir = osp.join(parser_dir, parser_attr['result-parser-dir'])
         parser_exe_file = osp.join(parser_dir, parser_attr['result-parser-cmd'])
@@ -94,7 +96,11 @@ def read_task_info_file(weakness_count_file):
     return (short_msg, status, long_msg)
 
 
-def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
+def parse_results(input_dir, assessment_summary_file, results_dir, output_dir, name=None,
+                  parser_exe_file=None):
+    '''name is set to parse the results of one of the tools in run.conf
+    'tool-conf-files', the outputs are then parsed_results-<name>.
+    parser_exe_file is from get_results_parser, if it is already unarchived'''
 
     command_template = '{EXECUTABLE}\
  --summary_file={PATH_TO_SUMMARY_FILE}\
@@ -106,18 +112,22 @@ def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
     if not osp.isfile(assessment_summary_file):
         raise FileNotFoundException(assessment_summary_file)
 
-    parser_exe_file = _get_results_parser(input_dir)
+    if parser_exe_file is None:
+        parser_exe_file = get_results_parser(input_dir)
 
     services_conf_file = osp.join(input_dir, 'services.conf')
     if osp.isfile(services_conf_file):
         command_template += ' --services_conf_file={SERVICES_CONF_FILE}'
 
-    parse_results_dir = osp.join(os.getcwd(), 'parsed_results')
+    parse_results_dir = osp.join(os.getcwd(),
+                                 'parsed_results' if name is None else 'parsed_results-' + name)
     if not osp.isdir(parse_results_dir):
         os.mkdir(parse_results_dir)
 
     parsed_results_data_conf_file = osp.join(parse_results_dir, 'parsed_results_data.conf')
 
+    outputs = dict()
+
     try:
         parse_results_logfile = osp.join(parse_results_dir, 'resultparser.log')
         parse_results_output_file = osp.join(parse_results_dir, 'parsed_results.xml')
@@ -127,7 +137,7 @@ def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
         resultparser_stdout_file = osp.join(parse_results_dir, stdout_filename)
         resultparser_stderr_file = osp.join(parse_results_dir, stderr_filename)
 
-        with LogTaskStatus('parse-results') as status_dot_out:
+        with LogTaskStatus('parse-results', msg_inline=name) as status_dot_out:
 
             if 'PERL5LIB' in os.environ:
                 os.environ['PERL5LIB'] = '${0}:{1}'.format(os.environ['PERL5LIB'],
@@ -145,11 +155,13 @@ def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
                                               PARSED_RESULTS_DATA_CONF_FILE=parsed_results_data_conf_file,
                                               LOGFILE=parse_results_logfile)
 
-            exit_code, _ = utillib.run_cmd(command,
-                                           cwd=osp.dirname(parser_exe_file),
-                                           description='PARSE RESULTS',
-                                           outfile=resultparser_stdout_file,
-                                           errfile=resultparser_stderr_file)
+            cmd_result = utillib.run_cmd(command,
+                                         cwd=osp.dirname(parser_exe_file),
+                                         description='PARSE RESULTS',
+                                         outfile=resultparser_stdout_file,
+                                         errfile=resultparser_stderr_file)
+            exit_code = cmd_result.exit_code
+            outputs = cmd_result.outputs
 
             short_msg = ''
             status = 'PASS'
@@ -160,6 +172,9 @@ def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
                 status = 'FAIL'
                 long_msg = "weakness count file ({0}) not found".format(parse_weakness_count_file)
 
+            if name is not None:
+                short_msg = '{0}: {1}'.format(name, short_msg) if short_msg else name
+
             if status == 'SKIP':
                 status_dot_out.skip_task(short_msg, long_msg)
             else:
@@ -176,7 +191,7 @@ def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
         logging.exception(err)
         exit_code = 1
     finally:
-        with LogTaskStatus('parsed-results-archive'):
+        with LogTaskStatus('parsed-results-archive', msg_inline=name):
             shutil.make_archive(osp.join(output_dir,
                                          osp.basename(parse_results_dir)),
                                 'gztar',
@@ -189,10 +204,13 @@ def parse_results(input_dir, assessment_summary_file, results_dir, output_dir):
 
         parsed_results_conf['parsed-results-dir'] = osp.basename(parse_results_dir)
         parsed_results_conf['parsed-results-archive'] = '{0}.tar.gz'.format(osp.basename(parse_results_dir))
-        parsed_results_conf['resultparser-stdout-file'] = stdout_filename
-        parsed_results_conf['resultparser-stderr-file'] = stderr_filename
+        # With '.gz' if they are compressed
+        parsed_results_conf['resultparser-stdout-file'] = osp.basename(utillib.get_output_file(outputs,
+                                                                                               resultparser_stdout_file))
+        parsed_results_conf['resultparser-stderr-file'] = osp.basename(utillib.get_output_file(outputs,
+                                                                                               resultparser_stderr_file))
 
-        utillib.write_to_file(osp.join(output_dir, 'parsed_results.conf'),
+        utillib.write_to_file(osp.join(output_dir, osp.basename(parse_results_dir) + '.conf'),
                               parsed_results_conf)
 
         if not fileFound and exit_code == 0:
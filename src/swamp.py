@@ -10,6 +10,7 @@ from . import install_os_dependencies
 from . import results_parser
 from . import utillib
 from . import build
+from . import taskgraph
 
 
 def main(input_root_dir,
@@ -27,6 +28,9 @@ def main(input_root_dir,
 
             param = confreader.read_conf_into_dict(run_conf_file)
 
+            # Every command of the job draws on this time budget, see utillib.run_cmd
+            utillib.set_job_timeout(param.get('job-timeout'))
+
             if 'goal' not in param:
                 raise KeyError('{0} param not found in {1} file'.format('goal',
                                                                         osp.basename(run_conf_file)))
@@ -56,7 +60,12 @@ def main(input_root_dir,
                                                 tool_root_dir,
                                                 results_root_dir)
             elif goal in swamp_goals[3:5]:
-                raise NotImplementedError
+                exit_code = _assess_parse(goal,
+                                          input_root_dir,
+                                          output_root_dir,
+                                          build_root_dir,
+                                          tool_root_dir,
+                                          results_root_dir)
             elif goal == swamp_goals[5]:
                 exit_code = results_parser.just_parse(input_root_dir, output_root_dir)
 
@@ -76,23 +85,147 @@ def _build_assess_parse(goal, input_root_dir, output_root_dir,
                         build_root_dir, tool_root_dir,
                         results_root_dir):
 
-    (exit_code, build_summary_file) = build.build(input_root_dir,
-                                                  output_root_dir,
-                                                  build_root_dir)
+    if 'assess' not in goal:
+        (exit_code, _) = build.build(input_root_dir,
+                                     output_root_dir,
+                                     build_root_dir)
+        return exit_code
+
+    graph = taskgraph.TaskGraph()
+    graph.add('build', lambda: build.build(input_root_dir,
+                                           output_root_dir,
+                                           build_root_dir,
+                                           build_archive=False))
+
+    # The build archive is created while the tools are installed and run
+    graph.add('build-archive',
+              lambda _: build.archive(output_root_dir, build_root_dir),
+              'build')
+
+    return _assess_parse_tasks(graph, goal, 'build',
+                               input_root_dir,
+                               output_root_dir,
+                               build_root_dir,
+                               tool_root_dir,
+                               results_root_dir)
+
+
+def _assess_parse(goal, input_root_dir, output_root_dir,
+                  build_root_dir, tool_root_dir,
+                  results_root_dir):
+    '''Assess (and parse) the build from an earlier 'build' run'''
+
+    graph = taskgraph.TaskGraph()
+    graph.add('build-unarchive', lambda: build.restore(input_root_dir,
+                                                       build_root_dir))
+
+    return _assess_parse_tasks(graph, goal, 'build-unarchive',
+                               input_root_dir,
+                               output_root_dir,
+                               build_root_dir,
+                               tool_root_dir,
+                               results_root_dir)
+
+
+def _assess_parse_tasks(graph, goal, build_task,
+                        input_root_dir, output_root_dir,
+                        build_root_dir, tool_root_dir,
+                        results_root_dir):
+    '''Adds the assess and parse tasks to the graph, runs it and returns the exit code.
+    build_task is the task in the graph that returns (exit_code, build_summary_file).
+    Tools are unarchived and installed once the build is done, if it passed.
+    The result parser is unarchived without waiting for the build'''
 
-    if (exit_code == 0) and ('assess' in goal):
+    tool_runs = assess.get_tool_runs(input_root_dir, tool_root_dir, results_root_dir)
 
-        build_summary_file = osp.join(build_root_dir, build_summary_file)
-        (exit_code, assessment_summary_file) = assess.assess(input_root_dir,
-                                                             output_root_dir,
-                                                             tool_root_dir,
-                                                             results_root_dir,
-                                                             build_summary_file)
+    def get_build_artifacts_helper(build_result):
+        (exit_code, build_summary_file) = build_result
+        if exit_code != 0:
+            return None
 
-        if (exit_code == 0) and ('parse' in goal):
-            exit_code = results_parser.parse_results(input_root_dir,
-                                                     assessment_summary_file,
-                                                     results_root_dir,
-                                                     output_root_dir)
+        return assess.get_build_artifacts_helper(osp.join(build_root_dir,
+                                                          build_summary_file))
 
-    return exit_code
+    graph.add('build-artifacts', get_build_artifacts_helper, build_task)
+
+    needs_build_artifacts = assess.needs_build_artifacts(input_root_dir, tool_runs)
+
+    # Tools are not installed if the build failed, the exit code is the build's
+    def install_tools(build_result, build_artifacts_helper=None):
+        if build_result[0] != 0 or \
+           (needs_build_artifacts and build_artifacts_helper is None):
+            return None
+
+        return assess.install_tools(input_root_dir, tool_runs, build_artifacts_helper)
+
+    if needs_build_artifacts:
+        graph.add('tool-install', install_tools, build_task, 'build-artifacts')
+    else:
+        graph.add('tool-install', install_tools, build_task)
+
+    def assess_tools(build_result, build_artifacts_helper, tools, *_):
+        if build_result[0] != 0:
+            return None
+
+        return assess.assess_tools(output_root_dir,
+                                   tool_runs,
+                                   tools,
+                                   build_artifacts_helper)
+
+    # Tools that modify the package directory wait for the build archive
+    if 'build-archive' in graph and assess.has_exclusive_tools(input_root_dir, tool_runs):
+        graph.add('assess', assess_tools,
+                  build_task, 'build-artifacts', 'tool-install', 'build-archive')
+    else:
+        graph.add('assess', assess_tools,
+                  build_task, 'build-artifacts', 'tool-install')
+
+    if 'parse' in goal:
+        graph.add('resultparser-unarchive',
+                  lambda: results_parser.get_results_parser(input_root_dir))
+        graph.add('parse',
+                  lambda tool_assessments, parser_exe_file: _parse(input_root_dir,
+                                                                   output_root_dir,
+                                                                   tool_assessments,
+                                                                   parser_exe_file),
+                  'assess', 'resultparser-unarchive')
+
+    results = graph.run()
+
+    (exit_code, _) = results[build_task]
+    if exit_code != 0:
+        return exit_code
+
+    return results['parse'] if 'parse' in goal \
+        else _get_exit_code(tool_assessment.exit_code for tool_assessment in results['assess'])
+
+
+def _get_exit_code(exit_codes):
+    '''The first non zero exit code'''
+
+    for exit_code in exit_codes:
+        if exit_code != 0:
+            return exit_code
+
+    return 0
+
+
+def _parse(input_root_dir, output_root_dir, tool_assessments, parser_exe_file):
+
+    if tool_assessments is None:
+        return 0
+
+    exit_codes = list()
+    for tool_assessment in tool_assessments:
+
+        if tool_assessment.exit_code == 0:
+            exit_codes.append(results_parser.parse_results(input_root_dir,
+                                                           tool_assessment.assessment_summary_file,
+                                                           tool_assessment.results_root_dir,
+                                                           output_root_dir,
+                                                           tool_assessment.name,
+                                                           parser_exe_file))
+        else:
+            exit_codes.append(tool_assessment.exit_code)
+
+    return _get_exit_code(exit_codes)
@@ -0,0 +1,78 @@
+'''
+Runs the steps of a job as a graph of tasks. A task starts as soon as
+the tasks it depends on are done, tasks that do not depend on each other
+run at the same time in threads.
+'''
+
+import logging
+import concurrent.futures
+from collections import OrderedDict
+
+
+class TaskGraph:
+
+    def __init__(self):
+        self._tasks = OrderedDict()
+
+    def __contains__(self, name):
+        return name in self._tasks
+
+    def add(self, name, func, *depends_on):
+        '''func is called with the results of the tasks in depends_on,
+        which must have been added before'''
+
+        for dep in depends_on:
+            if dep not in self._tasks:
+                raise KeyError("Task '{0}' depends on unknown task '{1}'".format(name, dep))
+
+        self._tasks[name] = (func, depends_on)
+
+    def run(self):
+        '''Runs all the tasks, returns a dictionary of task name to result.
+        If a task raises an exception, the tasks that depend on it are not run,
+        and the exception is raised once the running tasks are done'''
+
+        results = dict()
+        not_done = set()
+        error = None
+
+        pending = OrderedDict(self._tasks)
+        running = dict()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self._tasks) or 1) as executor:
+            while pending or running:
+
+                # Dependencies are added before the tasks, one pass in order is enough
+                for name in list(pending.keys()):
+                    func, depends_on = pending[name]
+
+                    if any(dep in not_done for dep in depends_on):
+                        logging.info('TASK NOT RUN %s', name)
+                        not_done.add(name)
+                        pending.pop(name)
+                    elif all(dep in results for dep in depends_on):
+                        future = executor.submit(func, *[results[dep] for dep in depends_on])
+                        running[future] = name
+                        pending.pop(name)
+
+                if not running:
+                    break
+
+                done, _ = concurrent.futures.wait(running.keys(),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as err:
+                        not_done.add(name)
+                        if error is None:
+                            error = err
+                        else:
+                            logging.exception(err)
+
+        if error is not None:
+            raise error
+
+        return results
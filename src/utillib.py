@@ -6,11 +6,18 @@ import datetime
 import time
 import re
 import shlex
+import struct
 import uuid
 import logging
+import signal
+import select
+import threading
+import gzip
 import zipfile
-import pdb
+import xml.etree.ElementTree as ET
 import pkgutil
+from collections import namedtuple
+from collections import deque
 
 
 if 'PermissionError' in __builtins__:
@@ -124,6 +131,431 @@ def unpack_archive(archive, dirpath, createdir=True):
         raise ValueError('Format not supported')
 
 
+# Resources used by a command, times in seconds, max_rss_kb in kilobytes,
+# block_input and block_output in number of filesystem blocks
+ResourceUsage = namedtuple('ResourceUsage', ['wall_time', 'user_time', 'system_time',
+                                             'max_rss_kb', 'block_input', 'block_output'])
+
+
+# Seconds between SIGTERM and SIGKILL when a command times out
+CMD_KILL_GRACE = 10
+
+
+def parse_size(size):
+    '''Converts a size like 500M or 20G to bytes'''
+
+    if size is None or size.strip() == '':
+        return None
+
+    size = size.strip().upper()
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    else:
+        return int(size)
+
+
+# Host wide settings for the stdout and stderr files of commands,
+# see run_cmd
+OUTPUT_MAX_SIZE_ENV = 'SWAMP_OUTPUT_MAX_SIZE'
+OUTPUT_COMPRESS_ENV = 'SWAMP_OUTPUT_COMPRESS'
+
+# file is the file written, with '.gz' if it is compressed,
+# size is the number of bytes the command wrote,
+# truncated is True if the middle of the output was dropped
+CapturedOutput = namedtuple('CapturedOutput', ['file', 'size', 'truncated'])
+
+
+class _OutputCapture(threading.Thread):
+    '''Copies what a command writes to a pipe into a file, keeping the first
+    and the last max_size / 2 bytes, gzip compressed if compress is True'''
+
+    def __init__(self, filename, max_size, compress):
+        threading.Thread.__init__(self, daemon=True)
+        self.read_fd, self.write_fd = os.pipe()
+        self.file = filename + '.gz' if compress else filename
+        self._fobj = gzip.open(self.file, 'wb') if compress else open(self.file, 'wb')
+        self._head_size = max_size // 2 if max_size else None
+        self._tail_size = max_size - self._head_size if max_size else None
+        self._tail = deque()
+        self._tail_len = 0
+        self._stop_reading = threading.Event()
+        self.size = 0
+
+    def _write(self, data):
+
+        if self._head_size is None:
+            self._fobj.write(data)
+        else:
+            head_left = max(self._head_size - self.size, 0)
+            if head_left:
+                self._fobj.write(data[:head_left])
+
+            if len(data) > head_left:
+                self._tail.append(data[head_left:])
+                self._tail_len += len(data) - head_left
+
+                while len(self._tail) > 1 \
+                      and self._tail_len - len(self._tail[0]) >= self._tail_size:
+                    self._tail_len -= len(self._tail.popleft())
+
+        self.size += len(data)
+
+    def run(self):
+        try:
+            while not self._stop_reading.is_set():
+                if select.select([self.read_fd], [], [], 1)[0]:
+                    data = os.read(self.read_fd, 1024 * 1024)
+                    if not data:
+                        break
+                    self._write(data)
+
+            if self._tail_len:
+                tail = b''.join(self._tail)
+                tail = tail[max(len(tail) - self._tail_size, 0):]
+                dropped = self.size - self._head_size - len(tail)
+                if dropped:
+                    self._fobj.write('\n[... {0} bytes dropped ...]\n'.format(dropped).encode('utf-8'))
+                self._fobj.write(tail)
+        finally:
+            os.close(self.read_fd)
+            self._fobj.close()
+
+    def close_write_fd(self):
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+            self.write_fd = None
+
+    def finish(self):
+        '''Waits for the end of the output, returns the CapturedOutput'''
+
+        self.close_write_fd()
+        self.join(CMD_KILL_GRACE)
+
+        if self.is_alive():
+            # Something the command started in the background still has the pipe
+            logging.info('OUTPUT CAPTURE STOPPED %s', self.file)
+            self._stop_reading.set()
+            self.join()
+
+        return CapturedOutput(self.file, self.size,
+                              self._head_size is not None
+                              and self.size > self._head_size + self._tail_size)
+
+
+def get_output_file(outputs, filename):
+    '''Returns the file written for filename, outputs is CmdResult.outputs'''
+
+    if outputs and filename in outputs:
+        return outputs[filename].file
+    else:
+        return filename
+
+
+class CmdResult(namedtuple('CmdResult', ['exit_code', 'environ'])):
+    '''Unpacks as (exit_code, environ), usage is a ResourceUsage,
+    None if the command could not be started, timed_out is True
+    if the command was killed because it ran out of time, outputs maps
+    the outfile and errfile file names to CapturedOutput'''
+
+    def __new__(cls, exit_code, environ, usage=None, timed_out=False, outputs=None):
+        self = super().__new__(cls, exit_code, environ)
+        self.usage = usage
+        self.timed_out = timed_out
+        self.outputs = outputs or dict()
+        return self
+
+
+# Set to true to store the environment of the commands once per summary,
+# see add_environment
+SUMMARY_ENV_DIFF_ENV = 'SWAMP_SUMMARY_ENV_DIFF'
+
+
+def env_diff_enabled():
+    return string_to_bool(os.getenv(SUMMARY_ENV_DIFF_ENV, 'false').lower())
+
+
+def get_env_diff(base, environ):
+    '''Returns (changed, removed), the variables of environ that are not in base
+    or have another value, and the names of the variables of base not in environ'''
+
+    changed = {key: value for key, value in environ.items() if base.get(key) != value}
+    removed = [key for key in base.keys() if key not in environ]
+
+    return (changed, removed)
+
+
+def apply_env_diff(base, changed, removed):
+    '''Returns the environment that get_env_diff(base, environment) was for'''
+
+    environ = {key: value for key, value in base.items() if key not in removed}
+    environ.update(changed)
+
+    return environ
+
+
+def _add_env_elems(parent, environ):
+    for key, value in environ.items():
+        ET.SubElement(parent, 'env').text = '{0}={1}'.format(key, value)
+
+
+def _read_env_elems(parent):
+    return dict(elem.text.split('=', 1) for elem in parent.iter('env') if elem.text)
+
+
+class XmlStreamWriter:
+    '''
+    Writes an XML document to a file while it is built, so that large
+    summaries are not kept in memory and a crash leaves what was written.
+    write writes a complete element, start and end open and close an
+    element whose children are written in between, close ends the open
+    elements. The output is the same as that of
+    ElementTree.write(encoding='UTF-8', xml_declaration=True)
+    '''
+
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, filename, root_tag):
+        self._fobj = open(filename, 'wb')
+        self._open_tags = list()
+        self._kept = set()
+        self._flush_time = time.time()
+
+        self._fobj.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+        self.start(root_tag)
+
+    def _write(self, text):
+        self._fobj.write(text.encode('utf-8', 'xmlcharrefreplace'))
+
+        if time.time() - self._flush_time > XmlStreamWriter.FLUSH_INTERVAL:
+            self._fobj.flush()
+            self._flush_time = time.time()
+
+    def start(self, tag):
+        self._write('<{0}>'.format(tag))
+        self._open_tags.append(tag)
+
+    def end(self):
+        self._write('</{0}>'.format(self._open_tags.pop()))
+
+    def write(self, elem):
+        self._write(ET.tostring(elem, encoding='unicode'))
+
+    def write_children(self, parent, keep=(), on_write=None):
+        '''Writes the children of parent that are not written yet and removes
+        them from parent, except the ones with a tag in keep that stay in parent.
+        on_write is called with every child written'''
+
+        for child in list(parent):
+            if id(child) not in self._kept:
+                self.write(child)
+                if on_write:
+                    on_write(child)
+
+            if child.tag in keep:
+                self._kept.add(id(child))
+            else:
+                parent.remove(child)
+
+    def close(self):
+        if self._fobj.closed:
+            return
+
+        while self._open_tags:
+            self.end()
+
+        self._fobj.close()
+
+
+def add_environment(summary_root, parent, environ):
+    '''Adds the <environment> of a command to parent, an element of summary_root.
+
+    By default it has every variable: <env>NAME=VALUE</env>. If SWAMP_SUMMARY_ENV_DIFF
+    is true, the first environment added is stored once as <base-environment>
+    in summary_root, and <environment diff="true"> only has the variables that
+    differ from it, and <unset-env>NAME</unset-env> for those that are not set'''
+
+    env_elem = ET.SubElement(parent, 'environment')
+
+    if not env_diff_enabled():
+        _add_env_elems(env_elem, environ)
+        return env_elem
+
+    base_elem = summary_root.find('base-environment')
+
+    if base_elem is None:
+        base_elem = ET.SubElement(summary_root, 'base-environment')
+        _add_env_elems(base_elem, environ)
+
+    changed, removed = get_env_diff(_read_env_elems(base_elem), environ)
+
+    env_elem.set('diff', 'true')
+    _add_env_elems(env_elem, changed)
+    for key in removed:
+        ET.SubElement(env_elem, 'unset-env').text = key
+
+    return env_elem
+
+
+def read_environment(summary_root, env_elem):
+    '''Returns the full environment of an <environment> element
+    written by add_environment, as a dictionary'''
+
+    if env_elem.get('diff') != 'true':
+        return _read_env_elems(env_elem)
+
+    return apply_env_diff(_read_env_elems(summary_root.find('base-environment')),
+                          _read_env_elems(env_elem),
+                          [elem.text for elem in env_elem.iter('unset-env')])
+
+
+_logged_environ = None
+
+
+def _log_environ(description, environ):
+    '''If SWAMP_SUMMARY_ENV_DIFF is true, only the first environment
+    is logged in full, the others as changes to it'''
+
+    global _logged_environ
+
+    if not env_diff_enabled() or _logged_environ is None:
+        logging.info('%s ENVIRONMENT %s', description, environ)
+
+        if env_diff_enabled():
+            _logged_environ = dict(environ)
+    else:
+        changed, removed = get_env_diff(_logged_environ, environ)
+        logging.info('%s ENVIRONMENT CHANGED %s UNSET %s', description, changed, removed)
+
+
+def resource_usage_items(usage):
+    '''Returns a list of (xml tag, text) for the ResourceUsage'''
+
+    return [(field.replace('_', '-'),
+             '{0:.6f}'.format(value) if isinstance(value, float) else str(value))
+            for field, value in zip(usage._fields, usage)]
+
+
+_job_deadline = None
+
+
+def parse_timeout(timeout):
+    '''Converts a timeout in seconds (a string or a number) to a float,
+    None if it is None, empty, 0 or less: no timeout'''
+
+    if timeout is None or str(timeout).strip() == '':
+        return None
+
+    try:
+        seconds = float(timeout)
+    except ValueError:
+        raise ValueError("Invalid timeout '{0}', expected a number of seconds".format(timeout))
+
+    return seconds if seconds > 0 else None
+
+
+def set_job_timeout(timeout):
+    '''Commands started with run_cmd are killed once timeout seconds
+    have passed from now, see parse_timeout for no deadline'''
+
+    global _job_deadline
+
+    timeout = parse_timeout(timeout)
+    _job_deadline = time.monotonic() + timeout if timeout is not None else None
+
+
+def get_cmd_timeout(timeout=None):
+    '''Returns the seconds a command may run, the smaller of timeout and
+    the time left until the job deadline, None if neither is set'''
+
+    timeouts = list()
+
+    timeout = parse_timeout(timeout)
+    if timeout is not None:
+        timeouts.append(timeout)
+
+    if _job_deadline is not None:
+        timeouts.append(_job_deadline - time.monotonic())
+
+    return min(timeouts) if timeouts else None
+
+
+def _wait_until(pid, deadline):
+    '''Returns what os.wait4 returns, pid is 0 if the process
+    is still running at deadline'''
+
+    delay = 0.0005
+    while True:
+        result = os.wait4(pid, os.WNOHANG)
+        remaining = deadline - time.monotonic()
+
+        if result[0] != 0 or remaining <= 0:
+            return result
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+def _kill_group(pgid, signum):
+    try:
+        os.killpg(pgid, signum)
+    except OSError:
+        pass
+
+
+def _wait(popen, timeout=None):
+    '''Waits for the process with wait4, returns the exit code, the ResourceUsage
+    (None without wait4) and True if it timed out. A process that times out is in its own process group,
+    the group gets SIGTERM, then SIGKILL after CMD_KILL_GRACE seconds'''
+
+    start_time = time.monotonic()
+    timed_out = False
+
+    if not hasattr(os, 'wait4'):
+        # Windows_NT, no resource usage
+        try:
+            popen.wait(timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            popen.terminate()
+            try:
+                popen.wait(CMD_KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                popen.kill()
+                popen.wait()
+
+        return (popen.returncode, None, timed_out)
+
+    if timeout is None:
+        _, status, rusage = os.wait4(popen.pid, 0)
+    else:
+        pid, status, rusage = _wait_until(popen.pid, start_time + timeout)
+
+        if pid == 0:
+            timed_out = True
+            _kill_group(popen.pid, signal.SIGTERM)
+            pid, status, rusage = _wait_until(popen.pid, time.monotonic() + CMD_KILL_GRACE)
+
+            # Also kills what the command left behind in the group
+            _kill_group(popen.pid, signal.SIGKILL)
+
+            if pid == 0:
+                _, status, rusage = os.wait4(popen.pid, 0)
+
+    wall_time = time.monotonic() - start_time
+
+    if os.WIFSIGNALED(status):
+        popen.returncode = -os.WTERMSIG(status)
+    else:
+        popen.returncode = os.WEXITSTATUS(status)
+
+    return (popen.returncode,
+            ResourceUsage(wall_time, rusage.ru_utime, rusage.ru_stime,
+                          rusage.ru_maxrss, rusage.ru_inblock, rusage.ru_oublock),
+            timed_out)
+
+
 def run_cmd(cmd,
             outfile=sys.stdout,
             errfile=sys.stderr,
@@ -131,14 +563,37 @@ def run_cmd(cmd,
             cwd='.',
             shell=False,
             env=None,
-            description='UNKNOWN'):
-    '''argument cmd should be a list'''
+            description='UNKNOWN',
+            timeout=None,
+            capture=True):
+    '''argument cmd should be a list, returns a CmdResult.
+    The command is killed after timeout seconds or at the job deadline,
+    see set_job_timeout, whichever comes first.
+
+    If outfile or errfile is a file name and capture is True, the file keeps
+    at most SWAMP_OUTPUT_MAX_SIZE bytes (suffixes K, M, G are allowed) of the
+    beginning and the end of the output, and is gzip compressed to
+    <file name>.gz if SWAMP_OUTPUT_COMPRESS is true. Set capture to False
+    for files that are read afterwards, like assessment reports'''
+
+    max_size = parse_size(os.getenv(OUTPUT_MAX_SIZE_ENV))
+    compress = string_to_bool(os.getenv(OUTPUT_COMPRESS_ENV, 'false').lower())
+    captures = dict()
 
     def openfile(filename, mode):
+        if isinstance(filename, str) and mode == 'w' and capture and (max_size or compress):
+            # stdout and stderr to the same file share the capture
+            if filename not in captures:
+                captures[filename] = _OutputCapture(filename, max_size, compress)
+                captures[filename].start()
+            return captures[filename].write_fd
+
         return open(filename, mode) if(isinstance(filename, str)) else filename
 
     def closefile(filename, fileobj):
-        if isinstance(filename, str):
+        if filename in captures:
+            captures[filename].close_write_fd()
+        elif isinstance(filename, str):
             fileobj.close()
 
     out = openfile(outfile, 'w')
@@ -150,20 +605,35 @@ def run_cmd(cmd,
 
     environ = dict(os.environ) if env is None else env
     environ['PWD'] = osp.abspath(cwd)
+    usage = None
+    timed_out = False
+    timeout = get_cmd_timeout(timeout)
+    # If Popen raises, the exception is what the caller gets
+    exit_code = 1
 
     try:
         logging.info('%s COMMAND %s', description, cmd)
         logging.info('%s WORKING DIR %s', description, environ['PWD'])
 
-        popen = subprocess.Popen(cmd,
-                                 stdout=out,
-                                 stderr=err,
-                                 stdin=inn,
-                                 shell=shell,
-                                 cwd=environ['PWD'],
-                                 env=environ)
-        popen.wait()
-        exit_code = popen.returncode
+        if timeout is not None and timeout <= 0:
+            logging.info('%s NOT RUN, JOB TIMEOUT', description)
+            exit_code = 1
+            timed_out = True
+        else:
+            popen = subprocess.Popen(cmd,
+                                     stdout=out,
+                                     stderr=err,
+                                     stdin=inn,
+                                     shell=shell,
+                                     cwd=environ['PWD'],
+                                     env=environ,
+                                     start_new_session=(timeout is not None))
+
+            # Only the command has the write end of the pipes now
+            closefile(outfile, out)
+            closefile(errfile, err)
+
+            exit_code, usage, timed_out = _wait(popen, timeout)
     except (subprocess.CalledProcessError, FileNotFoundException) as exception:
         if hasattr(exception, 'returncode'):
             exit_code = err.returncode
@@ -171,13 +641,25 @@ def run_cmd(cmd,
             exit_code = 1
     finally:
         logging.info('%s EXIT CODE %s', description, exit_code)
-        logging.info('%s ENVIRONMENT %s', description, environ)
+        if timed_out:
+            logging.info('%s TIMEOUT %.0f SECONDS', description, timeout)
+        if usage is not None:
+            logging.info('%s RESOURCE USAGE %s', description, usage)
+        _log_environ(description, environ)
 
         closefile(outfile, out)
         closefile(errfile, err)
         closefile(infile, inn)
 
-    return (exit_code, environ)
+        outputs = dict()
+        for filename in [outfile] if errfile == outfile else [outfile, errfile]:
+            if filename in captures:
+                outputs[filename] = captures[filename].finish()
+                logging.info('%s OUTPUT %s', description, outputs[filename])
+            elif isinstance(filename, str) and osp.isfile(filename):
+                outputs[filename] = CapturedOutput(filename, osp.getsize(filename), False)
+
+    return CmdResult(exit_code, environ, usage, timed_out, outputs)
 
 
 def get_cmd_output(cmd, cwd=None):
@@ -197,20 +679,57 @@ def get_cpu_type():
         return None
 
 
-def max_cmd_size():
-    # expr `getconf ARG_MAX` - `env|wc -c` - `env|wc -l` \* 4 - 2048
-    #arg_max = subprocess.check_output(['getconf', 'ARG_MAX'])
-    #arg_max = int(arg_max.decode(encoding='utf-8').strip())
-    # if arg_max > 131072:
+# execve counts a pointer for every argument and environment string
+POINTER_SIZE = struct.calcsize('P')
+
+# Longest single argument or environment string Linux accepts, MAX_ARG_STRLEN
+MAX_ARG_STRLEN = 32 * 4096
+
+# The most Linux allows for arguments and environment together,
+# whatever the stack limit is (3/4 of _STK_LIM)
+_KERNEL_ARG_MAX = 6 * 1024 * 1024
+
+
+def get_arg_size(args):
+    '''Bytes the strings take in execve, with the NUL and the pointer of each'''
+    return sum(len(os.fsencode(arg)) + 1 + POINTER_SIZE for arg in args)
+
+
+def get_env_size(environ):
+    return get_arg_size('{0}={1}'.format(key, value) for key, value in environ.items())
+
+
+def max_cmd_size(env=None):
+    '''Returns the bytes left for the arguments of a command run with env
+    (os.environ if None), counted as in get_arg_size'''
 
     if platform() == 'Windows_NT':
         return 32767
-    else:
+
+    try:
+        arg_max = min(os.sysconf('SC_ARG_MAX'), _KERNEL_ARG_MAX)
+    except (ValueError, OSError):
         arg_max = 131072
-        env_len = len(''.join([str(k) + ' ' + str(os.environ[k]) for k in os.environ.keys()]))
-        env_num = len(os.environ.keys())  # for null ptr
-        arg_max = arg_max - env_len - env_num * 4 - 2048  # extra caution
-        return arg_max
+
+    if arg_max <= 0:
+        arg_max = 131072
+
+    # The NULL pointers at the end of argv and envp, and some room for
+    # what run_cmd adds to the environment (PWD)
+    return arg_max - get_env_size(os.environ if env is None else env) \
+        - 2 * POINTER_SIZE - 4096
+
+
+def get_max_jobs(value):
+    '''Converts a max-jobs setting into a number of workers,
+    'auto' uses all the cpus, empty or None runs one job at a time'''
+
+    if value is None or str(value).strip() == '':
+        return 1
+    elif str(value).strip().lower() == 'auto':
+        return os.cpu_count() or 1
+    else:
+        return max(1, int(value))
 
 
 def platform():
@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+
+'''
+Compares the directory walkers of src/fileutil.py on synthetic trees:
+os.walk, fileutil.walk and fileutil.parallel_walk with different numbers
+of threads. Checks that they find the same files, in the same order for
+walk and parallel_walk.
+
+To measure a slow filesystem (NFS, overlay), use --tmp-dir on it.
+'''
+
+import argparse
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import time
+
+
+def make_tree(root_dir, depth, width, files):
+    '''width subdirectories per directory down to depth, files in each,
+    plus a hidden and an excluded (node_modules) directory at the top'''
+
+    count = 0
+    dirs = [root_dir]
+
+    for level in range(depth + 1):
+        next_dirs = list()
+        for _dir in dirs:
+            for index in range(files):
+                with open(osp.join(_dir, 'file{0}.js'.format(index)), 'w') as fobj:
+                    fobj.write('var x = {0};\n'.format(index))
+                count += 1
+
+            if level < depth:
+                for index in range(width):
+                    subdir = osp.join(_dir, 'dir{0}'.format(index))
+                    os.mkdir(subdir)
+                    next_dirs.append(subdir)
+        dirs = next_dirs
+
+    for special in ['.git', 'node_modules']:
+        os.mkdir(osp.join(root_dir, special))
+        shutil.copytree(osp.join(root_dir, 'dir0'), osp.join(root_dir, special, 'dir0'))
+
+    return count
+
+
+def os_walk_files(root_dir):
+    '''The walk filter_out used to do'''
+
+    file_list = list()
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [_dir for _dir in dirnames
+                       if not _dir.startswith('.') and _dir != 'node_modules']
+        file_list.extend(osp.join(dirpath, _file) for _file in filenames
+                         if osp.splitext(_file)[1] == '.js')
+    return file_list
+
+
+def best_time(func, runs):
+    times = list()
+    for _ in range(runs):
+        start_time = time.time()
+        result = func()
+        times.append(time.time() - start_time)
+    return (min(times), result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the directory walkers')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--width', type=int, default=6)
+    parser.add_argument('--files', type=int, default=20, help='files per directory')
+    parser.add_argument('--threads', default='2,4,8,16',
+                        help='comma separated numbers of threads for parallel_walk')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--tmp-dir', default=None)
+    args = parser.parse_args()
+
+    root_dir = osp.dirname(osp.dirname(osp.abspath(__file__)))
+    sys.path.insert(0, osp.join(root_dir, 'lib'))
+    sys.path.insert(0, root_dir)
+    os.environ.setdefault('SCRIPTS_DIR', root_dir)
+
+    from src import fileutil
+
+    tree_dir = tempfile.mkdtemp(prefix='bench_walk-', dir=args.tmp_dir)
+
+    try:
+        count = make_tree(tree_dir, args.depth, args.width, args.files)
+        print('tree: {0}, {1} files'.format(tree_dir, count))
+
+        ignore_matcher = fileutil.get_ignore_matcher(['node_modules'])
+
+        def files_of(walker):
+            return lambda: [entry.path for _, files in walker(tree_dir, ignore_matcher)
+                            for entry in files if osp.splitext(entry.name)[1] == '.js']
+
+        walk_time, walk_files = best_time(files_of(fileutil.walk), args.runs)
+        os_walk_time, os_files = best_time(lambda: os_walk_files(tree_dir), args.runs)
+
+        if sorted(os_files) != sorted(walk_files):
+            print('FAIL: os.walk and walk found different files')
+            return 1
+
+        print('{0:<24}{1:8.3f}s'.format('os.walk', os_walk_time))
+        print('{0:<24}{1:8.3f}s'.format('walk', walk_time))
+
+        for threads in [int(t) for t in args.threads.split(',')]:
+            walker = lambda root, matcher: fileutil.parallel_walk(root, matcher, threads)
+            parallel_time, parallel_files = best_time(files_of(walker), args.runs)
+
+            if parallel_files != walk_files:
+                print('FAIL: parallel_walk ({0} threads) is not the same as walk'.format(threads))
+                return 1
+
+            print('{0:<24}{1:8.3f}s'.format('parallel_walk ({0})'.format(threads),
+                                           parallel_time))
+    finally:
+        shutil.rmtree(tree_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+'''
+Checks the startup cost of the framework: imports the entry point in a new
+interpreter, fails if it takes longer than the budget or if it imports
+modules that should only be loaded when they are used
+'''
+
+import argparse
+import os
+import os.path as osp
+import subprocess
+import sys
+
+# Loaded on first use only by a single job, batch and daemon modes
+# load them before forking (batch.preload)
+LAZY_MODULES = [
+    'pdb',
+    'yaml',
+    'src.assess.web_tools',
+    'src.assess.python_tools',
+    'src.assess.csharp_tools',
+    'src.gencmd_lextab',
+    'src.gencmd_parsetab',
+]
+
+IMPORT_SCRIPT = '''
+import sys
+import time
+sys.path[0:0] = [{lib_dir!r}, {root_dir!r}]
+start_time = time.time()
+import src.__main__
+print(time.time() - start_time)
+print(' '.join(sorted(sys.modules)))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of the framework')
+    parser.add_argument('--budget', type=float, default=0.5,
+                        help='maximum import time in seconds, default 0.5')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='the best of this many runs is used, default 5')
+    args = parser.parse_args()
+
+    root_dir = osp.dirname(osp.dirname(osp.abspath(__file__)))
+    script = IMPORT_SCRIPT.format(lib_dir=osp.join(root_dir, 'lib'), root_dir=root_dir)
+
+    # Set in the assessment VM, some modules read it at import
+    env = dict(os.environ)
+    env.setdefault('SCRIPTS_DIR', root_dir)
+
+    import_times = list()
+    for _ in range(args.runs):
+        output = subprocess.check_output([sys.executable, '-B', '-c', script],
+                                         env=env, universal_newlines=True)
+        import_time, modules = output.splitlines()[-2:]
+        import_times.append(float(import_time))
+
+    failed = False
+    best_time = min(import_times)
+    print('import time: {0:.3f}s, budget: {1:.3f}s'.format(best_time, args.budget))
+
+    if best_time > args.budget:
+        print('FAIL: import time is over the budget')
+        failed = True
+
+    for module in LAZY_MODULES:
+        if module in modules.split():
+            print('FAIL: {0} is imported at startup'.format(module))
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+#! /usr/bin/env python3
+
+'''
+Generates the gencmd lexer and parser tables (src/gencmd_lextab.py,
+src/gencmd_parsetab.py), run at release time and whenever the
+tokens or the grammar in src/gencmd.py change
+'''
+
+import os.path as osp
+import sys
+
+
+def main():
+    root_dir = osp.dirname(osp.dirname(osp.abspath(__file__)))
+
+    sys.path.insert(0, osp.join(root_dir, 'lib'))
+    sys.path.insert(0, root_dir)
+
+    from src import gencmd
+    gencmd.write_tables(osp.join(root_dir, 'src'))
+
+
+if __name__ == '__main__':
+    main()